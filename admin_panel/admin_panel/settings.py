@@ -93,6 +93,9 @@ DATABASES = {
     }
 }
 
+# کانال LISTEN/NOTIFY که ربات تغییرات سفارش‌ها و کاربرها رو ازش می‌گیره
+DB_EVENTS_CHANNEL = os.getenv("DB_EVENTS_CHANNEL", "bot_events")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
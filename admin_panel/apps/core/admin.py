@@ -1,8 +1,23 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
 
+from .events import order_event, publish
 from .models import Order, User
 
 
+def set_order_status(queryset, from_statuses, status):
+    # update گروهی سیگنال نمی‌فرسته، پس رویدادها اینجا منتشر می‌شن
+    with transaction.atomic():
+        orders = list(queryset.filter(status__in=from_statuses).select_for_update())
+        Order.objects.filter(id__in=[order.id for order in orders]).update(
+            status=status
+        )
+        for order in orders:
+            order.status = status
+        publish([order_event(order, "admin") for order in orders])
+    return len(orders)
+
+
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("telegram_id", "order_id", "plan_id", "status", "created_at")
     list_filter = ("status",)
@@ -10,11 +25,22 @@ class OrderAdmin(admin.ModelAdmin):
 
     @admin.action(description="تأیید پرداخت")
     def verify_payment(self, request, queryset):
-        queryset.update(status="verified")
+        # ساخت اکانت سفارش‌های verified رو ربات به‌صورت گروهی انجام می‌ده
+        updated = set_order_status(queryset, ["pending"], "verified")
+        self.message_user(
+            request,
+            f"{updated} سفارش برای ساخت اکانت در صف ربات قرار گرفت.",
+            messages.SUCCESS,
+        )
 
     @admin.action(description="رد پرداخت")
     def reject_payment(self, request, queryset):
-        queryset.update(status="rejected")
+        updated = set_order_status(queryset, ["pending", "verified"], "rejected")
+        self.message_user(request, f"{updated} سفارش رد شد.", messages.SUCCESS)
+
+    def save_model(self, request, obj, form, change):
+        obj.event_source = "admin"
+        super().save_model(request, obj, form, change)
 
 
 admin.site.register(User)
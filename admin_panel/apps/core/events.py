@@ -0,0 +1,47 @@
+import json
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+from .serializers import UserSerializer
+
+logger = logging.getLogger("core")
+
+# NOTIFY داخل تراکنش اجرا می‌شه و فقط بعد از commit به ربات می‌رسه
+NOTIFY_SQL = "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload"
+
+
+def order_event(order, source: str = "api") -> dict:
+    return {
+        "type": "order",
+        "order_id": str(order.order_id),
+        "telegram_id": order.telegram_id,
+        "status": order.status,
+        "is_renewal": order.is_renewal,
+        "receipt_url": order.receipt_url,
+        "created_at": order.created_at.isoformat().replace("+00:00", "Z"),
+        "source": source,
+    }
+
+
+def user_event(user, source: str = "api") -> dict:
+    return {
+        "type": "user",
+        "telegram_id": user.telegram_id,
+        "username": user.username,
+        # ربات با مقایسه‌ی این با کش خودش، رویداد ذخیره‌ی خودش رو نادیده می‌گیره
+        "user": UserSerializer(user).data,
+        "source": source,
+    }
+
+
+def publish(events: list):
+    if not events or connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            NOTIFY_SQL,
+            [settings.DB_EVENTS_CHANNEL, [json.dumps(event) for event in events]],
+        )
+    logger.debug(f"Published {len(events)} events on {settings.DB_EVENTS_CHANNEL}")
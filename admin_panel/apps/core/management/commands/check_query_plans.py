@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.core.models import Order, User
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+class Command(BaseCommand):
+    help = "Check that the bot's hot lookups on users and orders use their indexes"
+
+    def query_checks(self):
+        now = timezone.now()
+        return [
+            (
+                "user by telegram_id",
+                User.objects.filter(telegram_id=1),
+                "core_user_telegram_id_idx",
+            ),
+            (
+                "orders by telegram_id",
+                Order.objects.filter(telegram_id=1),
+                "core_order_tg_status_idx",
+            ),
+            (
+                "orders by telegram_id and status",
+                Order.objects.filter(telegram_id=1, status="pending"),
+                "core_order_tg_status_idx",
+            ),
+            (
+                "stale orders by status",
+                Order.objects.filter(status="pending", created_at__lt=now),
+                "core_order_status_created_idx",
+            ),
+            (
+                "users by expire",
+                User.objects.filter(expire__lt=int(now.timestamp())),
+                "core_user_expire_idx",
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("check_query_plans needs a PostgreSQL database")
+        failures = 0
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # با seq scan خاموش، کوئری‌ای که ایندکس مناسب نداره باز هم seq scan می‌کنه
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, queryset, index in self.query_checks():
+                plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+                nodes = list(plan_nodes(plan))
+                indexes = sorted({n["Index Name"] for n in nodes if "Index Name" in n})
+                seq_scans = [
+                    n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"
+                ]
+                if seq_scans or index not in indexes:
+                    failures += 1
+                    self.stderr.write(
+                        f"{name}: expected {index}, got indexes={indexes} "
+                        f"seq_scans={seq_scans}"
+                    )
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"{name}: {index}"))
+        if failures:
+            raise CommandError(f"{failures} lookups are not using their index")
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:30
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_id', models.BigIntegerField()),
+                ('order_id', models.UUIDField(default=uuid.uuid4, unique=True)),
+                ('plan_id', models.CharField(max_length=100)),
+                ('status', models.CharField(default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('receipt_url', models.URLField(blank=True, null=True)),
+                ('receipt_message_id', models.IntegerField(blank=True, null=True)),
+                ('is_renewal', models.BooleanField(default=False)),
+                ('price', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'core_order',
+            },
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_id', models.BigIntegerField(blank=True, null=True)),
+                ('username', models.CharField(max_length=100, unique=True)),
+                ('data_limit', models.BigIntegerField(blank=True, null=True)),
+                ('expire', models.BigIntegerField(blank=True, null=True)),
+                ('status', models.CharField(default='active', max_length=20)),
+                ('data_limit_reset_strategy', models.CharField(default='no_reset', max_length=50)),
+                ('subscription_url', models.CharField(blank=True, max_length=500, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'core_user',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+from apps.core.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY داخل transaction اجرا نمی‌شه
+    atomic = False
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='core_order_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_order_status_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiryNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=100)),
+                ('threshold', models.IntegerField()),
+                ('expire', models.BigIntegerField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'core_expiry_notification',
+                'constraints': [models.UniqueConstraint(fields=('username', 'threshold', 'expire'), name='core_expiry_notification_unique')],
+            },
+        ),
+    ]
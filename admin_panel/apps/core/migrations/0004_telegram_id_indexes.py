@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+from apps.core.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY داخل transaction اجرا نمی‌شه
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_expiry_notification'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['telegram_id', 'status', 'created_at'], name='core_order_tg_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(fields=['telegram_id'], name='core_user_telegram_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(fields=['expire'], name='core_user_expire_idx'),
+        ),
+    ]
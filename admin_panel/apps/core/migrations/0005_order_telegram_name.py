@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_telegram_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='tg_fullname',
+            field=models.CharField(blank=True, max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='tg_username',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
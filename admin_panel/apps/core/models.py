@@ -14,6 +14,10 @@ class User(models.Model):
 
     class Meta:
         db_table = "core_user"
+        indexes = [
+            models.Index(fields=["telegram_id"], name="core_user_telegram_id_idx"),
+            models.Index(fields=["expire"], name="core_user_expire_idx"),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.telegram_id})"
@@ -29,9 +33,39 @@ class Order(models.Model):
     receipt_message_id = models.IntegerField(null=True, blank=True)
     is_renewal = models.BooleanField(default=False)
     price = models.IntegerField()
+    tg_username = models.CharField(max_length=64, null=True, blank=True)
+    tg_fullname = models.CharField(max_length=150, null=True, blank=True)
 
     class Meta:
         db_table = "core_order"
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"], name="core_order_status_created_idx"
+            ),
+            models.Index(
+                fields=["telegram_id", "status", "created_at"],
+                name="core_order_tg_status_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.order_id} ({self.status})"
+
+
+class ExpiryNotification(models.Model):
+    username = models.CharField(max_length=100)
+    threshold = models.IntegerField()
+    expire = models.BigIntegerField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "core_expiry_notification"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["username", "threshold", "expire"],
+                name="core_expiry_notification_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.username} ({self.threshold} days, expire={self.expire})"
@@ -0,0 +1,24 @@
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently as PostgresAddIndexConcurrently,
+)
+from django.db.migrations import AddIndex
+
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    # روی Postgres با CREATE INDEX CONCURRENTLY و بدون قفل نوشتن روی جدول؛
+    # بقیه‌ی دیتابیس‌ها (مثلاً sqlite تست‌ها) همون AddIndex معمولی
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
@@ -2,7 +2,7 @@ import logging
 
 from rest_framework import serializers
 
-from .models import Order, User
+from .models import ExpiryNotification, Order, User
 
 logger = logging.getLogger("core")
 
@@ -16,7 +16,16 @@ console_handler.setFormatter(log_format)
 logger.addHandler(console_handler)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    # با پارامتر fields فقط فیلدهای خواسته‌شده در خروجی می‌مونن
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = [
@@ -30,7 +39,21 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class UserUpsertSerializer(UserSerializer):
+    class Meta(UserSerializer.Meta):
+        # یکتایی username رو خود upsert (ON CONFLICT) مدیریت می‌کنه
+        extra_kwargs = {"username": {"validators": []}}
+
+
+class ExpiryNotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ExpiryNotification
+        fields = ["username", "threshold", "expire"]
+        # یکتایی رو خود bulk_create با ignore_conflicts مدیریت می‌کنه
+        validators = []
+
+
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = [
@@ -44,6 +67,8 @@ class OrderSerializer(serializers.ModelSerializer):
             "is_renewal",
             "receipt_url",
             "receipt_message_id",
+            "tg_username",
+            "tg_fullname",
         ]
         read_only_fields = ["created_at"]
 
@@ -54,11 +79,12 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("telegram_id must be an integer")
         if "status" in attrs and attrs["status"] not in [
             "pending",
+            "verified",
             "confirmed",
             "rejected",
         ]:
             logger.error(f"Invalid status: {attrs['status']}")
             raise serializers.ValidationError(
-                "Status must be 'pending', 'confirmed', or 'rejected'"
+                "Status must be 'pending', 'verified', 'confirmed', or 'rejected'"
             )
         return attrs
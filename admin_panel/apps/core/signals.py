@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .events import order_event, publish, user_event
+from .models import Order, User
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    publish([order_event(instance, getattr(instance, "event_source", "api"))])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    publish([user_event(instance, getattr(instance, "event_source", "api"))])
@@ -0,0 +1,261 @@
+import json
+import uuid
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .management.commands.check_query_plans import Command, plan_nodes
+from .models import ExpiryNotification, Order, User
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class APITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_order(self, minutes_ago=0, **kwargs):
+        order = Order.objects.create(telegram_id=1, plan_id="p1", price=10, **kwargs)
+        if minutes_ago:
+            # created_at با auto_now_add پر می‌شه و فقط با update قابل تغییره
+            Order.objects.filter(pk=order.pk).update(
+                created_at=timezone.now() - timedelta(minutes=minutes_ago)
+            )
+        return order
+
+
+class OrderExpireTests(APITestCase):
+    def expire(self, data):
+        return self.client.post("/api/orders/expire/", data, format="json")
+
+    def test_expires_only_stale_orders_without_receipt(self):
+        stale = self.create_order(minutes_ago=60)
+        self.create_order(minutes_ago=60, receipt_url="https://x.ir/r.jpg")
+        self.create_order(minutes_ago=5)
+        self.create_order(minutes_ago=60, status="verified")
+        response = self.expire({"older_than_minutes": 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [o["order_id"] for o in response.json()], [str(stale.order_id)]
+        )
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, "rejected")
+        self.assertEqual(self.expire({"older_than_minutes": 30}).json(), [])
+
+    def test_order_ids_narrow_the_sweep(self):
+        first = self.create_order(minutes_ago=60)
+        second = self.create_order(minutes_ago=60)
+        response = self.expire({"order_ids": [str(second.order_id)]})
+        self.assertEqual(
+            [o["order_id"] for o in response.json()], [str(second.order_id)]
+        )
+        first.refresh_from_db()
+        self.assertEqual(first.status, "pending")
+
+    def test_invalid_body_is_rejected(self):
+        for data in (
+            [1],
+            {"older_than_minutes": "x"},
+            {"order_ids": "abc"},
+            {"order_ids": ["not-a-uuid"]},
+        ):
+            with self.subTest(data):
+                self.assertEqual(self.expire(data).status_code, 400)
+
+
+class UserUpsertTests(APITestCase):
+    def test_creates_then_updates_same_user(self):
+        data = {"username": "alice", "telegram_id": 7, "data_limit": 10}
+        response = self.client.post("/api/users/upsert/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+        data["data_limit"] = 20
+        response = self.client.post("/api/users/upsert/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data_limit"], 20)
+        self.assertEqual(User.objects.filter(username="alice").count(), 1)
+
+    def test_invalid_data_is_rejected(self):
+        response = self.client.post(
+            "/api/users/upsert/", {"telegram_id": 7}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderConfirmTests(APITestCase):
+    user = {"username": "bob", "telegram_id": 1, "expire": 1000}
+
+    def confirm(self, order_id, data=None):
+        return self.client.post(
+            f"/api/orders/{order_id}/confirm/",
+            {"user": self.user} if data is None else data,
+            format="json",
+        )
+
+    def test_confirms_order_and_upserts_user(self):
+        order = self.create_order(status="verified")
+        response = self.confirm(order.order_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["already_confirmed"])
+        self.assertEqual(response.json()["user"]["username"], "bob")
+        order.refresh_from_db()
+        self.assertEqual(order.status, "confirmed")
+
+    def test_repeated_confirm_is_idempotent(self):
+        order = self.create_order()
+        self.confirm(order.order_id)
+        response = self.confirm(order.order_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["already_confirmed"])
+        self.assertEqual(User.objects.filter(username="bob").count(), 1)
+
+    def test_rejected_order_cannot_be_confirmed(self):
+        order = self.create_order(status="rejected")
+        response = self.confirm(order.order_id)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(User.objects.filter(username="bob").exists())
+
+    def test_invalid_body_is_rejected(self):
+        order = self.create_order()
+        for data in ([1, 2], {"user": [1]}, {"user": {"telegram_id": 1}}):
+            with self.subTest(data):
+                self.assertEqual(self.confirm(order.order_id, data).status_code, 400)
+
+    def test_unknown_order(self):
+        self.assertEqual(self.confirm(uuid.uuid4()).status_code, 404)
+        self.assertEqual(self.confirm("not-a-uuid").status_code, 404)
+
+
+class ListResponseTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            User.objects.create(telegram_id=i + 1, username=f"user{i}", expire=i)
+
+    def test_without_limit_returns_full_list(self):
+        response = self.client.get("/api/users/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 5)
+
+    def test_cursor_walks_every_page_once(self):
+        usernames = []
+        params = {"limit": 2}
+        pages = 0
+        while True:
+            response = self.client.get("/api/users/", params)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page["results"]), 2)
+            usernames += [user["username"] for user in page["results"]]
+            pages += 1
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+        self.assertEqual(pages, 3)
+        self.assertEqual(usernames, [f"user{i}" for i in range(5)])
+
+    def test_fields_limits_output(self):
+        response = self.client.get(
+            "/api/users/", {"fields": "username,telegram_id", "limit": 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"], [{"telegram_id": 1, "username": "user0"}]
+        )
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/api/users/", {"fields": "username,password"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_limit_or_cursor_is_rejected(self):
+        for params in ({"limit": 0}, {"limit": "x"}, {"cursor": "x"}):
+            with self.subTest(params):
+                response = self.client.get("/api/users/", params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_expiry_ledger_is_paginated(self):
+        for i in range(3):
+            ExpiryNotification.objects.create(
+                username=f"user{i}", threshold=3, expire=100
+            )
+        response = self.client.get("/api/notifications/expiry/", {"limit": 2})
+        self.assertEqual(len(response.json()["results"]), 2)
+        self.assertIsNotNone(response.json()["next_cursor"])
+
+
+class UsernameLookupTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # نام تلگرام آزاده و ممکنه کاما و حروف فارسی داشته باشه
+        self.usernames = ["علی، رضا: @a", "Ali, Reza: @b", "plain"]
+        for i, username in enumerate(self.usernames):
+            User.objects.create(telegram_id=i + 1, username=username)
+            ExpiryNotification.objects.create(username=username, threshold=3, expire=1)
+
+    def lookup(self, url, data):
+        return self.client.post(url, data, format="json")
+
+    def test_users_by_username(self):
+        response = self.lookup(
+            "/api/users/lookup/?fields=username",
+            {"usernames": self.usernames[:2] + ["missing"]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(
+            response.json(), [{"username": name} for name in self.usernames[:2]]
+        )
+
+    def test_expiry_ledger_by_username(self):
+        response = self.lookup(
+            "/api/notifications/expiry/lookup/", {"usernames": ["Ali, Reza: @b"]}
+        )
+        self.assertEqual(
+            response.json(),
+            [{"username": "Ali, Reza: @b", "threshold": 3, "expire": 1}],
+        )
+
+    def test_invalid_body_is_rejected(self):
+        for data in (
+            ["plain"],
+            {"usernames": "plain"},
+            {"usernames": [1]},
+            {"usernames": ["x"] * 1001},
+        ):
+            with self.subTest(data=str(data)[:40]):
+                response = self.lookup("/api/users/lookup/", data)
+                self.assertEqual(response.status_code, 400)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_lookups_have_a_matching_index(self):
+        # بدون Postgres هم چک می‌شه که ایندکس با فیلترهای کوئری جور باشه و ساخته شده باشه
+        with connection.cursor() as cursor:
+            for name, queryset, index_name in Command().query_checks():
+                with self.subTest(name):
+                    model = queryset.model
+                    indexes = {index.name: index for index in model._meta.indexes}
+                    self.assertIn(index_name, indexes)
+                    filtered = {
+                        child.lhs.target.name
+                        for child in queryset.query.where.children
+                    }
+                    fields = indexes[index_name].fields
+                    self.assertEqual(set(fields[: len(filtered)]), filtered)
+                    constraints = connection.introspection.get_constraints(
+                        cursor, model._meta.db_table
+                    )
+                    self.assertIn(index_name, constraints)
+
+    @skipUnless(connection.vendor == "postgresql", "EXPLAIN checks need PostgreSQL")
+    def test_hot_lookups_use_their_index(self):
+        with connection.cursor() as cursor:
+            # TestCase داخل transaction اجرا می‌شه، پس SET LOCAL فقط برای همین تست‌ه
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, queryset, index in Command().query_checks():
+            with self.subTest(name):
+                plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+                nodes = list(plan_nodes(plan))
+                self.assertIn(index, {n.get("Index Name") for n in nodes})
+                self.assertNotIn("Seq Scan", {n["Node Type"] for n in nodes})
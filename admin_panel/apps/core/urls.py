@@ -1,19 +1,43 @@
 from django.urls import path
 
 from .views import (
+    ExpiryNotificationListCreateView,
+    ExpiryNotificationLookupView,
+    OrderConfirmView,
+    OrderExpireView,
     OrderListCreateView,
     OrderUpdateView,
     ReceiptUploadView,
     ReportView,
     UserListCreateView,
+    UserLookupView,
     UserUpdateView,
+    UserUpsertView,
 )
 
 urlpatterns = [
     path("users/", UserListCreateView.as_view(), name="user-list-create"),
+    path("users/lookup/", UserLookupView.as_view(), name="user-lookup"),
+    path("users/upsert/", UserUpsertView.as_view(), name="user-upsert"),
     path("users/<str:username>/", UserUpdateView.as_view(), name="user-update"),
     path("orders/", OrderListCreateView.as_view(), name="order-list-create"),
+    path("orders/expire/", OrderExpireView.as_view(), name="order-expire"),
     path("orders/<str:order_id>/", OrderUpdateView.as_view(), name="order-update"),
+    path(
+        "orders/<str:order_id>/confirm/",
+        OrderConfirmView.as_view(),
+        name="order-confirm",
+    ),
     path("receipts/", ReceiptUploadView.as_view(), name="receipt-upload"),
     path("reports/", ReportView.as_view(), name="reports"),
+    path(
+        "notifications/expiry/",
+        ExpiryNotificationListCreateView.as_view(),
+        name="expiry-notification-list-create",
+    ),
+    path(
+        "notifications/expiry/lookup/",
+        ExpiryNotificationLookupView.as_view(),
+        name="expiry-notification-lookup",
+    ),
 ]
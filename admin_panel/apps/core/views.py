@@ -1,13 +1,23 @@
 import logging
+import uuid
 from datetime import datetime, timedelta
 
-from django.db.models import Sum
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Order, User
-from .serializers import OrderSerializer, UserSerializer
+from .events import publish, user_event
+from .models import ExpiryNotification, Order, User
+from .serializers import (
+    ExpiryNotificationSerializer,
+    OrderSerializer,
+    UserSerializer,
+    UserUpsertSerializer,
+)
 
 logger = logging.getLogger("core")
 
@@ -21,6 +31,90 @@ console_handler.setFormatter(log_format)
 logger.addHandler(console_handler)
 
 
+def upsert_user(data):
+    update_fields = [field for field in data if field != "username"]
+    if not update_fields:
+        user, _ = User.objects.get_or_create(username=data["username"])
+        return user
+    # INSERT ... ON CONFLICT (username) DO UPDATE در یک کوئری
+    User.objects.bulk_create(
+        [User(**data)],
+        update_conflicts=True,
+        unique_fields=["username"],
+        update_fields=update_fields,
+    )
+    user = User.objects.get(username=data["username"])
+    publish([user_event(user)])
+    return user
+
+
+# سقف limit در صفحه‌بندی cursor
+PAGE_MAX_LIMIT = 1000
+
+
+def list_response(request, queryset, serializer_class, name):
+    fields = request.query_params.get("fields")
+    if fields:
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(fields) - set(serializer_class.Meta.fields)
+        if unknown:
+            logger.error(f"Unknown {name} fields requested: {unknown}")
+            return Response(
+                {"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = queryset.only(*fields)
+    else:
+        fields = None
+    limit = request.query_params.get("limit")
+    cursor = request.query_params.get("cursor")
+    # بدون limit و cursor خروجی مثل قبل لیست کامل است
+    if limit is None and cursor is None:
+        serializer = serializer_class(queryset, many=True, fields=fields)
+        logger.info(f"Returning {len(serializer.data)} {name}")
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    try:
+        limit = min(int(limit or PAGE_MAX_LIMIT), PAGE_MAX_LIMIT)
+        cursor = int(cursor or 0)
+        if limit < 1:
+            raise ValueError(limit)
+    except ValueError:
+        logger.error(f"Invalid pagination params: limit={limit}, cursor={cursor}")
+        return Response(
+            {"error": "Invalid limit or cursor"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    # keyset: صفحه‌ی بعد از آخرین id صفحه‌ی قبل شروع می‌شه، بدون OFFSET
+    page = list(queryset.filter(id__gt=cursor).order_by("id")[: limit + 1])
+    next_cursor = page[limit - 1].id if len(page) > limit else None
+    serializer = serializer_class(page[:limit], many=True, fields=fields)
+    logger.info(f"Returning {len(serializer.data)} {name} after cursor {cursor}")
+    return Response(
+        {"results": serializer.data, "next_cursor": next_cursor},
+        status=status.HTTP_200_OK,
+    )
+
+
+def usernames_lookup(request, queryset, serializer_class, name):
+    # username ها (که ممکنه کاما داشته باشن) به صورت لیست JSON در body میان،
+    # نه در query string که طولش محدوده
+    usernames = (
+        request.data.get("usernames") if isinstance(request.data, dict) else None
+    )
+    if (
+        not isinstance(usernames, list)
+        or len(usernames) > PAGE_MAX_LIMIT
+        or not all(isinstance(username, str) for username in usernames)
+    ):
+        logger.error(f"Invalid {name} lookup body: {request.data}")
+        return Response(
+            {"error": f"usernames must be a list of at most {PAGE_MAX_LIMIT} strings"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return list_response(
+        request, queryset.filter(username__in=usernames), serializer_class, name
+    )
+
+
 class UserListCreateView(APIView):
     def get(self, request):
         telegram_id = request.query_params.get("telegram_id")
@@ -29,9 +123,7 @@ class UserListCreateView(APIView):
             users = User.objects.filter(telegram_id=telegram_id)
         else:
             users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        logger.info(f"Returning {len(serializer.data)} users")
-        return Response(serializer.data)
+        return list_response(request, users, UserSerializer, "users")
 
     def post(self, request):
         logger.debug(f"Creating user in Django with data: {request.data}")
@@ -44,6 +136,23 @@ class UserListCreateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class UserLookupView(APIView):
+    def post(self, request):
+        return usernames_lookup(request, User.objects.all(), UserSerializer, "users")
+
+
+class UserUpsertView(APIView):
+    def post(self, request):
+        logger.debug(f"Upserting user in Django with data: {request.data}")
+        serializer = UserUpsertSerializer(data=request.data)
+        if not serializer.is_valid():
+            logger.error(f"Invalid data for user upsert: {serializer.errors}")
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        user = upsert_user(serializer.validated_data)
+        logger.info(f"User {user.username} upserted in Django")
+        return Response(UserSerializer(user).data, status=status.HTTP_200_OK)
+
+
 class UserUpdateView(APIView):
     def get(self, request, username):
         logger.debug(f"Fetching user {username}")
@@ -92,8 +201,10 @@ class OrderListCreateView(APIView):
     def get(self, request):
         telegram_id = request.query_params.get("telegram_id")
         status_param = request.query_params.get("status")
+        older_than = request.query_params.get("older_than_minutes")
         logger.debug(
-            f"Fetching orders with telegram_id={telegram_id}, status={status_param}"
+            f"Fetching orders with telegram_id={telegram_id}, status={status_param}, "
+            f"older_than_minutes={older_than}"
         )
 
         queryset = Order.objects.all()
@@ -109,11 +220,18 @@ class OrderListCreateView(APIView):
         if status_param:
             status_param = status_param.strip()
             queryset = queryset.filter(status=status_param)
+        if older_than:
+            try:
+                cutoff = timezone.now() - timedelta(minutes=int(older_than))
+            except ValueError:
+                logger.error(f"Invalid older_than_minutes: {older_than}")
+                return Response(
+                    {"error": "Invalid older_than_minutes"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            queryset = queryset.filter(created_at__lt=cutoff)
 
-        logger.info(f"Queryset after filtering: {list(queryset.values())}")
-        serializer = OrderSerializer(queryset, many=True)
-        logger.info(f"Returning {queryset.count()} orders: {serializer.data}")
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return list_response(request, queryset, OrderSerializer, "orders")
 
     def post(self, request):
         logger.debug(f"Creating order with data: {request.data}")
@@ -126,6 +244,135 @@ class OrderListCreateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class OrderExpireView(APIView):
+    def post(self, request):
+        if not isinstance(request.data, dict):
+            logger.error(f"Invalid expire request body: {request.data}")
+            return Response(
+                {"error": "Request body must be an object"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        older_than = request.data.get("older_than_minutes", 30)
+        order_ids = request.data.get("order_ids")
+        logger.debug(
+            f"Expiring pending orders older than {older_than} minutes, order_ids={order_ids}"
+        )
+        try:
+            cutoff = timezone.now() - timedelta(minutes=int(older_than))
+        except (TypeError, ValueError):
+            logger.error(f"Invalid older_than_minutes: {older_than}")
+            return Response(
+                {"error": "Invalid older_than_minutes"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if order_ids is not None:
+            try:
+                if not isinstance(order_ids, list):
+                    raise ValueError(order_ids)
+                order_ids = [uuid.UUID(str(order_id)) for order_id in order_ids]
+            except ValueError:
+                logger.error(f"Invalid order_ids: {order_ids}")
+                return Response(
+                    {"error": "order_ids must be a list of UUIDs"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        queryset = Order.objects.filter(
+            status="pending", created_at__lt=cutoff, receipt_url__isnull=True
+        )
+        if order_ids is not None:
+            queryset = queryset.filter(order_id__in=order_ids)
+        try:
+            with transaction.atomic():
+                expired = list(
+                    queryset.select_for_update(skip_locked=True).values(
+                        "id", "order_id", "telegram_id", "is_renewal"
+                    )
+                )
+                Order.objects.filter(id__in=[o["id"] for o in expired]).update(
+                    status="rejected"
+                )
+                publish(
+                    [
+                        {
+                            "type": "order",
+                            "order_id": str(o["order_id"]),
+                            "telegram_id": o["telegram_id"],
+                            "status": "rejected",
+                            "is_renewal": o["is_renewal"],
+                            "source": "expiry",
+                        }
+                        for o in expired
+                    ]
+                )
+        except Exception as e:
+            logger.error(f"Error expiring pending orders: {str(e)}")
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        logger.info(f"Expired {len(expired)} pending orders")
+        return Response(
+            [
+                {
+                    "order_id": str(o["order_id"]),
+                    "telegram_id": o["telegram_id"],
+                    "is_renewal": o["is_renewal"],
+                }
+                for o in expired
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+
+class OrderConfirmView(APIView):
+    def post(self, request, order_id):
+        logger.debug(f"Confirming order {order_id} with data: {request.data}")
+        if not isinstance(request.data, dict):
+            logger.error(f"Invalid confirm request body for order {order_id}")
+            return Response(
+                {"error": "Request body must be an object"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = UserUpsertSerializer(data=request.data.get("user"))
+        if not serializer.is_valid():
+            logger.error(f"Invalid user data for order {order_id}: {serializer.errors}")
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            try:
+                order = Order.objects.select_for_update().get(order_id=order_id)
+            except (Order.DoesNotExist, ValidationError):
+                logger.error(f"Order not found: {order_id}")
+                return Response(
+                    {"error": f"Order with order_id {order_id} not found"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            if order.status not in ("pending", "verified", "confirmed"):
+                logger.error(f"Order {order_id} is {order.status}, cannot confirm")
+                return Response(
+                    {"error": f"Order {order_id} is {order.status}"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            # تأیید تکراری همون نتیجه‌ی قبلی رو برمی‌گردونه و چیزی رو تغییر نمی‌ده
+            already_confirmed = order.status == "confirmed"
+            if already_confirmed:
+                logger.warning(f"Order {order_id} is already confirmed")
+                user = User.objects.filter(
+                    username=serializer.validated_data["username"]
+                ).first()
+            else:
+                user = upsert_user(serializer.validated_data)
+                order.status = "confirmed"
+                order.save(update_fields=["status"])
+                logger.info(f"Order {order_id} confirmed for user {user.username}")
+        return Response(
+            {
+                "order": OrderSerializer(order).data,
+                "user": UserSerializer(user).data if user else None,
+                "already_confirmed": already_confirmed,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class OrderUpdateView(APIView):
     def get(self, request, order_id):
         logger.debug(f"Fetching order {order_id}")
@@ -201,6 +448,47 @@ class ReceiptUploadView(APIView):
             )
 
 
+class ExpiryNotificationListCreateView(APIView):
+    def get(self, request):
+        return list_response(
+            request,
+            ExpiryNotification.objects.all(),
+            ExpiryNotificationSerializer,
+            "expiry notifications",
+        )
+
+    def post(self, request):
+        serializer = ExpiryNotificationSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            logger.error(f"Invalid expiry notification data: {serializer.errors}")
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        entries = serializer.validated_data
+        if not entries:
+            return Response([], status=status.HTTP_201_CREATED)
+        # ردیف‌های مربوط به expire قبلی (قبل از تمدید) دیگه لازم نیستن
+        stale = Q()
+        for entry in entries:
+            stale |= Q(username=entry["username"]) & ~Q(expire=entry["expire"])
+        with transaction.atomic():
+            ExpiryNotification.objects.filter(stale).delete()
+            ExpiryNotification.objects.bulk_create(
+                [ExpiryNotification(**entry) for entry in entries],
+                ignore_conflicts=True,
+            )
+        logger.info(f"Recorded {len(entries)} expiry notifications")
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ExpiryNotificationLookupView(APIView):
+    def post(self, request):
+        return usernames_lookup(
+            request,
+            ExpiryNotification.objects.all(),
+            ExpiryNotificationSerializer,
+            "expiry notifications",
+        )
+
+
 class ReportView(APIView):
     def get(self, request):
         total_users = User.objects.count()
@@ -8,9 +8,72 @@ ADMIN_TELEGRAM_ID = int(os.getenv("ADMIN_TELEGRAM_ID", "123456789"))
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "default_password")
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000/api/")
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_PAGE_SIZE = int(os.getenv("BATCH_PAGE_SIZE", "50"))
+BOT_MODE = os.getenv("BOT_MODE", "polling")
 BOT_TOKEN = os.getenv("BOT_TOKEN", "default_bot_token")
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
 CARD_NUMBER = os.getenv("CARD_NUMBER", "1234-5678-9012-3456")
 CARD_HOLDER = os.getenv("CARD_HOLDER", "Default Card Holder")
 CHANNEL_ID = os.getenv("CHANNEL_ID", "@default_channel")
+DB_EVENTS = os.getenv("DB_EVENTS", "false").lower() == "true"
+DB_EVENTS_CHANNEL = os.getenv("DB_EVENTS_CHANNEL", "bot_events")
+DB_HOST = os.getenv("DB_HOST", "db")
+DB_NAME = os.getenv("DB_NAME", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "")
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+DB_USER = os.getenv("DB_USER", "postgres")
+DIRECT_DB_READS = os.getenv("DIRECT_DB_READS", "false").lower() == "true"
 DJANGO_API_URL = os.getenv("DJANGO_API_URL", "http://localhost:8001/api/")
+EXPIRY_LOOKUP_BATCH_SIZE = int(os.getenv("EXPIRY_LOOKUP_BATCH_SIZE", "100"))
+FSM_BATCH_SIZE = int(os.getenv("FSM_BATCH_SIZE", "100"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+FSM_CACHE_TTL = float(
+    os.getenv("FSM_CACHE_TTL", "0" if BOT_MODE == "webhook" else "10")
+)
+FSM_CLEANUP_INTERVAL = float(os.getenv("FSM_CLEANUP_INTERVAL", "3600"))
+FSM_FLUSH_INTERVAL = float(
+    os.getenv("FSM_FLUSH_INTERVAL", "0" if BOT_MODE == "webhook" else "0.5")
+)
+FSM_MEMORY_IDLE_TTL = float(os.getenv("FSM_MEMORY_IDLE_TTL", "86400"))
+FSM_MEMORY_MAX_ENTRIES = int(os.getenv("FSM_MEMORY_MAX_ENTRIES", "50000"))
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "86400"))
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("HTTP_RETRY_BASE_DELAY", "0.2"))
+HTTP_RETRY_MAX_DELAY = float(os.getenv("HTTP_RETRY_MAX_DELAY", "2"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+MARZBAN_TOKEN_REFRESH_MARGIN = float(os.getenv("MARZBAN_TOKEN_REFRESH_MARGIN", "300"))
+MARZBAN_USERS_PAGE_SIZE = int(os.getenv("MARZBAN_USERS_PAGE_SIZE", "1000"))
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", "/path/to/media")
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "10000"))
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", "300"))
+MEMBERSHIP_NEGATIVE_TTL = float(os.getenv("MEMBERSHIP_NEGATIVE_TTL", "30"))
+ORDER_EXPIRY_MINUTES = int(os.getenv("ORDER_EXPIRY_MINUTES", "30"))
+PROVISION_QUEUE_SIZE = int(os.getenv("PROVISION_QUEUE_SIZE", "100"))
+PROVISION_WORKERS = int(os.getenv("PROVISION_WORKERS", "4"))
+RUN_BACKGROUND_TASKS = os.getenv("RUN_BACKGROUND_TASKS", "true").lower() == "true"
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", "1000"))
+SEND_QUEUE_WORKERS = int(os.getenv("SEND_QUEUE_WORKERS", "4"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "16"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+USER_NEGATIVE_TTL = float(os.getenv("USER_NEGATIVE_TTL", "30"))
+VERIFIED_ORDERS_POLL_INTERVAL = float(os.getenv("VERIFIED_ORDERS_POLL_INTERVAL", "30"))
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/bot/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
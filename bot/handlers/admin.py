@@ -1,24 +1,31 @@
-from aiogram import Bot, Router
+from aiogram import Bot, F, Router
 from aiogram.filters import Command
-from aiogram.types import Message
-from config import ADMIN_TELEGRAM_ID, API_BASE_URL, CHANNEL_ID
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, Message
+from config import BATCH_PAGE_SIZE, CHANNEL_ID
 from keyboards.main_menu import get_channel_join_keyboard, get_main_menu
+from keyboards.receipt_menu import get_batch_review_menu
+from middlewares.update_pool import update_pool
+from middlewares.user_context import UserContext, has_user_context
 from services.api_client import APIClient
-from services.check_channel_membership import check_channel_membership
-from services.user_service import create_user
+from services.check_channel_membership import membership_cache
+from services.db_events import db_events
+from services.order_service import iter_orders_by_status
+from services.provisioning import provisioning_queue
+from services.send_queue import send_queue
+from services.user_service import create_user, user_cache
 from utils.logger import logger
-from utils.marzban import get_jwt_token
+from utils.marzban import marzban_request
+from utils.plans import get_plan_by_id
 
 
 router = Router()
-
-
-async def is_admin(user_id: int) -> bool:
-    return user_id == ADMIN_TELEGRAM_ID
+router.message.filter(has_user_context)
+router.callback_query.filter(has_user_context)
 
 
 @router.message(Command("adduser"))
-async def adduser_command(message: Message, bot: Bot):
+async def adduser_command(message: Message, bot: Bot, ctx: UserContext):
     if not message.from_user:
         await message.reply(
             "❌ *خطا: کاربر نامشخص است!*",
@@ -26,15 +33,15 @@ async def adduser_command(message: Message, bot: Bot):
             reply_markup=get_main_menu(),
         )
         return
-    user_id = message.from_user.id
-    if not await check_channel_membership(bot, user_id):
+    user_id = ctx.user_id
+    if not ctx.is_member:
         await message.reply(
             f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
             parse_mode="Markdown",
             reply_markup=get_channel_join_keyboard(),
         )
         return
-    if not await is_admin(user_id):
+    if not ctx.is_admin:
         await message.reply(
             "❌ *این دستور فقط برای ادمین‌ها قابل استفاده است!*",
             parse_mode="Markdown",
@@ -84,7 +91,7 @@ async def adduser_command(message: Message, bot: Bot):
 
 
 @router.message(Command("servers"))
-async def servers_command(message: Message, bot: Bot):
+async def servers_command(message: Message, bot: Bot, ctx: UserContext):
     if not message.from_user:
         await message.reply(
             "❌ *خطا: کاربر نامشخص است!*",
@@ -92,15 +99,14 @@ async def servers_command(message: Message, bot: Bot):
             reply_markup=get_main_menu(),
         )
         return
-    user_id = message.from_user.id
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         await message.reply(
             f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
             parse_mode="Markdown",
             reply_markup=get_channel_join_keyboard(),
         )
         return
-    if not await is_admin(user_id):
+    if not ctx.is_admin:
         await message.reply(
             "❌ *این دستور فقط برای ادمین‌ها قابل استفاده است!*",
             parse_mode="Markdown",
@@ -108,10 +114,7 @@ async def servers_command(message: Message, bot: Bot):
         )
         return
     try:
-        headers = {"Authorization": f"Bearer {get_jwt_token()}"}
-        nodes = await APIClient.get(
-            "/api/nodes", headers=headers, base_url=API_BASE_URL
-        )
+        nodes = await marzban_request("GET", "/api/nodes")
         reply = "*لیست سرورها:* 🗄️\n\n"
         for node in nodes:
             reply += f"🖥️ *ID*: {node['id']}, *نام*: {node['name']}, *وضعیت*: {node['status']}\n"
@@ -123,3 +126,140 @@ async def servers_command(message: Message, bot: Bot):
             parse_mode="Markdown",
             reply_markup=get_main_menu(),
         )
+
+
+def format_stats(title: str, stats: dict) -> str:
+    lines = "\n".join(f"• `{key}`: `{value}`" for key, value in stats.items())
+    return f"*{title}*\n{lines}"
+
+
+@router.message(Command("stats"))
+async def stats_command(
+    message: Message, bot: Bot, ctx: UserContext, state: FSMContext
+):
+    if not ctx.is_admin:
+        await message.reply(
+            "❌ *این دستور فقط برای ادمین‌ها قابل استفاده است!*",
+            parse_mode="Markdown",
+            reply_markup=get_main_menu(),
+        )
+        return
+    sections = [
+        format_stats("درخواست‌های HTTP 🌐", APIClient.stats()),
+        format_stats("مدارشکن بک‌اندها ⚡", APIClient.breaker_stats()),
+        format_stats("پردازش آپدیت‌ها ⚙️", update_pool.stats()),
+        format_stats("صف ارسال پیام 📤", send_queue.stats()),
+        format_stats("صف تأیید سفارش‌ها 🧾", provisioning_queue.stats()),
+        format_stats("رویدادهای دیتابیس 📡", db_events.stats()),
+        format_stats("کش عضویت کانال 📢", membership_cache.stats()),
+        format_stats("کش کاربران 👤", user_cache.stats()),
+    ]
+    if hasattr(state.storage, "stats"):
+        sections.append(format_stats("ذخیره‌سازی FSM 💾", state.storage.stats()))
+    await message.reply("\n\n".join(sections), parse_mode="Markdown")
+
+
+def batch_label(order: dict) -> str:
+    plan = get_plan_by_id(order["plan_id"])
+    return (
+        f"{'🔄' if order.get('is_renewal') else '🆕'} {plan['name'] if plan else order['plan_id']}"
+        f" | {order['price']} | {order['telegram_id']}"
+    )
+
+
+@router.message(Command("pending"))
+async def pending_command(message: Message, ctx: UserContext, state: FSMContext):
+    if not ctx.is_admin:
+        await message.reply(
+            "❌ *این دستور فقط برای ادمین‌ها قابل استفاده است!*",
+            parse_mode="Markdown",
+            reply_markup=get_main_menu(),
+        )
+        return
+    # فقط سفارش‌هایی که رسیدشون رسیده؛ صفحه‌ها به ترتیب id یعنی قدیمی‌ترها اول
+    page = []
+    total = 0
+    try:
+        async for order in iter_orders_by_status("pending"):
+            if not order.get("receipt_url"):
+                continue
+            total += 1
+            if len(page) < BATCH_PAGE_SIZE:
+                page.append([order["order_id"], batch_label(order)])
+    except Exception as e:
+        await message.reply(
+            f"❌ *خطا در دریافت سفارش‌ها*: {str(e)}", parse_mode="Markdown"
+        )
+        return
+    if not page:
+        await message.reply(
+            "✅ *هیچ رسید در انتظار بررسی وجود ندارد!*", parse_mode="Markdown"
+        )
+        return
+    await state.update_data(batch_orders=page, batch_selected=[])
+    await message.reply(
+        f"🧾 *{total} رسید در انتظار بررسی*"
+        f"{f' (نمایش {len(page)} مورد اول)' if total > len(page) else ''}\n"
+        "سفارش‌ها رو انتخاب کن و بعد تأیید یا رد رو بزن.",
+        parse_mode="Markdown",
+        reply_markup=get_batch_review_menu(page, []),
+    )
+
+
+@router.callback_query(F.data.startswith("batch/"))
+async def batch_review_action(
+    callback: CallbackQuery, ctx: UserContext, state: FSMContext
+):
+    if not ctx.is_admin:
+        await callback.answer(
+            "❌ فقط ادمین می‌تونه این عملیات رو انجام بده!", show_alert=True
+        )
+        return
+    if not isinstance(callback.message, Message):
+        await callback.answer()
+        return
+    action, _, order_id = callback.data.removeprefix("batch/").partition("/")
+    data = await state.get_data()
+    orders = data.get("batch_orders")
+    if not orders:
+        await callback.answer(
+            "⚠️ این لیست منقضی شده، دوباره /pending رو بزن.", show_alert=True
+        )
+        return
+    # انتخاب‌ها توی داده‌ی FSM چت ادمین نگه داشته می‌شن
+    selected = data.get("batch_selected", [])
+
+    if action in ("toggle", "all"):
+        if action == "toggle":
+            selected = (
+                [o for o in selected if o != order_id]
+                if order_id in selected
+                else [*selected, order_id]
+            )
+        else:
+            selected = [] if len(selected) == len(orders) else [o for o, _ in orders]
+        await state.update_data(batch_selected=selected)
+        await callback.message.edit_reply_markup(
+            reply_markup=get_batch_review_menu(orders, selected)
+        )
+        await callback.answer()
+        return
+
+    if action != "cancel" and not selected:
+        await callback.answer("⚠️ هیچ سفارشی انتخاب نشده!", show_alert=True)
+        return
+    await state.update_data(batch_orders=None, batch_selected=None)
+    if action == "cancel":
+        await callback.message.edit_text("🚫 بررسی گروهی لغو شد.")
+        await callback.answer()
+        return
+    await callback.message.edit_text(
+        f"⏳ {'تأیید' if action == 'confirm' else 'رد'} {len(selected)} سفارش در حال انجام است..."
+    )
+    provisioning_queue.submit_batch(
+        selected,
+        action,
+        chat_id=callback.message.chat.id,
+        message_id=callback.message.message_id,
+    )
+    await callback.answer()
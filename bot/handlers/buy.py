@@ -13,21 +13,21 @@ from keyboards.main_menu import (
     get_main_menu,
     get_main_menu_inline,
 )
-from services.check_channel_membership import check_channel_membership
+from middlewares.user_context import UserContext, has_user_context
 from services.order_service import (
     save_order,
 )
 from utils.logger import logger
 from utils.plans import get_plan_by_id
 
-from .admin import is_admin
-
 router = Router()
+router.message.filter(has_user_context)
+router.callback_query.filter(has_user_context)
 
 
 @router.message(Command("buy"))
 @router.message(F.text == "🛒 خرید اکانت")
-async def buy_command(message: Message, bot: Bot):
+async def buy_command(message: Message, bot: Bot, ctx: UserContext):
     if not message.from_user:
         await message.reply(
             "❌ *خطا: کاربر نامشخص است!*",
@@ -35,9 +35,9 @@ async def buy_command(message: Message, bot: Bot):
             reply_markup=get_main_menu(),
         )
         return
-    user_id = message.from_user.id
+    user_id = ctx.user_id
     logger.info(f"Buy command received from user {user_id}")
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         await message.reply(
             f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
             parse_mode="Markdown",
@@ -52,7 +52,7 @@ async def buy_command(message: Message, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data == "main_buy")
-async def main_buy(callback: CallbackQuery, bot: Bot):
+async def main_buy(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.debug(f"Received callback: main_buy from user {callback.from_user.id}")
 
     if isinstance(callback.message, Message):
@@ -65,9 +65,7 @@ async def main_buy(callback: CallbackQuery, bot: Bot):
             "callback.message is not deletable (InaccessibleMessage or None)"
         )
 
-    user_id = callback.from_user.id
-
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         if callback.message:
             await callback.message.answer(
                 f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
@@ -86,12 +84,11 @@ async def main_buy(callback: CallbackQuery, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data.startswith("buy_"))
-async def process_buy_type(callback: CallbackQuery, bot: Bot):
+async def process_buy_type(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.info(
         f"Received buy callback: {callback.data} from user {callback.from_user.id}"
     )
-    user_id = callback.from_user.id
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         if callback.message:
             await callback.message.answer(
                 f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
@@ -115,7 +112,7 @@ async def process_buy_type(callback: CallbackQuery, bot: Bot):
                     plan_dsc = "**نامشخص**"
                 logger.debug(f"Selected category: {category}")
                 if category == "back":
-                    is_admin_user = await is_admin(user_id)
+                    is_admin_user = ctx.is_admin
                     (
                         await callback.message.answer(
                             "*به منوی اصلی خوش اومدی!* 😊\nلطفاً یک گزینه انتخاب کن:",
@@ -145,13 +142,13 @@ async def process_buy_type(callback: CallbackQuery, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data.startswith("select_"))
-async def process_plan_selection(callback: CallbackQuery, bot: Bot):
+async def process_plan_selection(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.info(
         f"Received select callback: {callback.data} from user {callback.from_user.id}"
     )
     user_id = callback.from_user.id
-    is_admin_user = await is_admin(user_id)
-    if not await check_channel_membership(bot, user_id):
+    is_admin_user = ctx.is_admin
+    if not ctx.is_member:
         if callback.message:
             await callback.message.answer(
                 f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
@@ -4,18 +4,17 @@ from aiogram.filters import Command
 from aiogram.types import CallbackQuery, Message
 from config import CHANNEL_ID, API_BASE_URL
 from keyboards.main_menu import get_admin_menu, get_channel_join_keyboard, get_main_menu
-from services.check_channel_membership import check_channel_membership
-from services.user_service import get_user_by_telegram_id
+from middlewares.user_context import UserContext, has_user_context
 from utils.logger import logger
 
-from .admin import is_admin
-
 router = Router()
+router.message.filter(has_user_context)
+router.callback_query.filter(has_user_context)
 
 
 @router.message(Command("getlink"))
 @router.message(F.text == "🔗 دریافت لینک")
-async def getlink_command(message: Message, bot: Bot):
+async def getlink_command(message: Message, bot: Bot, ctx: UserContext):
     if not message.from_user:
         await message.reply(
             "❌ *خطا: کاربر نامشخص است!*",
@@ -23,9 +22,9 @@ async def getlink_command(message: Message, bot: Bot):
             reply_markup=get_main_menu(),
         )
         return
-    user_id = message.from_user.id
-    is_admin_user = await is_admin(user_id)
-    if not await check_channel_membership(bot, user_id):
+    user_id = ctx.user_id
+    is_admin_user = ctx.is_admin
+    if not ctx.is_member:
         await message.reply(
             f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
             parse_mode="Markdown",
@@ -33,7 +32,7 @@ async def getlink_command(message: Message, bot: Bot):
         )
         return
     try:
-        user = await get_user_by_telegram_id(user_id)
+        user = ctx.user
         if not user or not user.get("subscription_url"):
             (
                 await message.answer(
@@ -72,7 +71,7 @@ async def getlink_command(message: Message, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data == "main_getlink")
-async def main_getlink(callback: CallbackQuery, bot: Bot):
+async def main_getlink(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.debug(f"Received callback: main_getlink from user {callback.from_user.id}")
 
     if isinstance(callback.message, Message):
@@ -89,5 +88,5 @@ async def main_getlink(callback: CallbackQuery, bot: Bot):
     if isinstance(message, Message):
         message.from_user = callback.from_user
 
-    await getlink_command(message, bot)
+    await getlink_command(message, bot, ctx)
     await callback.answer()
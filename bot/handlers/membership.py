@@ -0,0 +1,25 @@
+from aiogram import Router
+from aiogram.types import ChatMemberUpdated
+from config import CHANNEL_ID
+from services.check_channel_membership import MEMBER_STATUSES, cache_membership
+from utils.logger import logger
+
+router = Router()
+
+
+def is_channel(event: ChatMemberUpdated) -> bool:
+    if str(event.chat.id) == str(CHANNEL_ID):
+        return True
+    return bool(event.chat.username) and (
+        f"@{event.chat.username}".lower() == str(CHANNEL_ID).lower()
+    )
+
+
+@router.chat_member(is_channel)
+async def channel_member_updated(event: ChatMemberUpdated):
+    user_id = event.new_chat_member.user.id
+    is_member = event.new_chat_member.status in MEMBER_STATUSES
+    cache_membership(user_id, is_member)
+    logger.debug(
+        f"Channel membership of user {user_id} changed to {event.new_chat_member.status}"
+    )
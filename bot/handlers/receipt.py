@@ -1,32 +1,39 @@
-import uuid
+import asyncio
 
 from aiogram import Bot, F, Router
 from aiogram.types import CallbackQuery, Message
 from config import ADMIN_TELEGRAM_ID, BOT_TOKEN, CHANNEL_ID
 from keyboards.main_menu import get_admin_menu, get_channel_join_keyboard, get_main_menu
 from keyboards.receipt_menu import get_receipt_admin_menu
-from services.check_channel_membership import check_channel_membership
+from middlewares.user_context import UserContext, has_user_context
 from services.order_service import (
-    get_order,
     get_orders,
     get_pending_orders,
     update_order,
 )
-from services.user_service import (
-    create_user,
-    get_user_by_telegram_id,
-    renew_user,
+from services.provisioning import (
+    ProvisioningError,
+    ProvisionJob,
+    processed_orders,
+    provisioning_queue,
+    reject_pending_order,
 )
+from services.send_queue import PRIORITY_ADMIN, send_queue
 from utils.logger import logger
 from utils.plans import get_plan_by_id
 
-from .admin import is_admin
-
 router = Router()
+router.message.filter(has_user_context)
+router.callback_query.filter(has_user_context)
+
+ALREADY_PROCESSED_TEXT = {
+    "confirmed": "ℹ️ این سفارش قبلاً تأیید شده است.",
+    "rejected": "ℹ️ این سفارش قبلاً رد شده است.",
+}
 
 
 @router.message(F.photo)
-async def handle_receipt(message: Message, bot: Bot):
+async def handle_receipt(message: Message, bot: Bot, ctx: UserContext):
     if not message.from_user:
         await message.reply(
             "❌ *خطا: کاربر نامشخص است!*",
@@ -35,12 +42,12 @@ async def handle_receipt(message: Message, bot: Bot):
         )
         return
 
-    user_id = message.from_user.id
-    is_admin_user = await is_admin(user_id)
+    user_id = ctx.user_id
+    is_admin_user = ctx.is_admin
 
     logger.info(f"Handling receipt for user: {user_id}")
 
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         logger.warning(f"User {user_id} not in channel {CHANNEL_ID}")
         await message.reply(
             f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
@@ -120,9 +127,10 @@ async def handle_receipt(message: Message, bot: Bot):
             if tg_userfn is not None and isinstance(tg_userfn, str):
                 tg_userfn_clean = tg_userfn.replace("/", "")
 
-            receipt_message = await bot.send_photo(
+            receipt_message = await send_queue.send_photo(
                 ADMIN_TELEGRAM_ID,
                 photo=message.photo[-1].file_id,
+                priority=PRIORITY_ADMIN,
                 caption=caption,
                 parse_mode="MarkdownV2",
                 reply_markup=get_receipt_admin_menu(
@@ -142,6 +150,9 @@ async def handle_receipt(message: Message, bot: Bot):
                     "receipt_message_id": receipt_message.message_id,
                     "status": "pending",
                     "telegram_id": user_id,
+                    # برای ساخت نام کاربری در تأیید گروهی و تأیید از پنل Django
+                    "tg_username": tg_username,
+                    "tg_fullname": tg_userfn.replace("/", "") if tg_userfn else None,
                 },
             )
             (
@@ -170,9 +181,9 @@ async def handle_receipt(message: Message, bot: Bot):
         )
 
 
-@router.callback_query(lambda c: c.data.startswith(("confirm_", "reject_")))
-async def process_order_action(callback: CallbackQuery, bot: Bot):
-    is_admin_user = await is_admin(callback.from_user.id)
+@router.callback_query(lambda c: c.data.startswith(("confirm/", "reject/")))
+async def process_order_action(callback: CallbackQuery, bot: Bot, ctx: UserContext):
+    is_admin_user = ctx.is_admin
     if not is_admin_user:
         await callback.answer(
             "❌ فقط ادمین می‌تونه این عملیات رو انجام بده!", show_alert=True
@@ -183,136 +194,66 @@ async def process_order_action(callback: CallbackQuery, bot: Bot):
 
         logger.info(f"Processing {action} for order {order_id}")
 
-        try:
-            order = await get_order(order_id)
-            telegram_id = order.get("telegram_id")
-            if not telegram_id or not isinstance(telegram_id, int):
-                logger.error(f"Invalid or missing telegram_id for order {order_id}")
-                await callback.answer("❌ telegram_id نامعتبر است!", show_alert=True)
-                return
-            plan_id, is_renewal = order["plan_id"], order.get("is_renewal", False)
-            plan = get_plan_by_id(plan_id)
-            if not plan:
-                logger.error(f"Invalid plan: {plan_id}")
-                await callback.answer("❌ پلن نامعتبره!", show_alert=True)
-                return
-            logger.info(f"Order {order_id} fetched successfully")
-        except Exception as e:
-            logger.error(f"Failed to fetch order {order_id}: {e}")
-            await callback.answer("❌ سفارش یافت نشد!", show_alert=True)
+        # سفارشی که تأیید یا رد شده دیگه با هیچ‌کدوم از دو دکمه عوض نمی‌شه
+        done = processed_orders.get(order_id, None)
+        if done in ALREADY_PROCESSED_TEXT:
+            logger.info(f"Order {order_id} was already {done}, skipping {action}")
+            await callback.answer(ALREADY_PROCESSED_TEXT[done], show_alert=True)
+            return
+        if provisioning_queue.is_queued(order_id):
+            await callback.answer(
+                "⏳ این سفارش در حال پردازش است، لطفاً صبر کن.", show_alert=True
+            )
             return
 
         if action == "confirm":
+            # ساخت/تمدید اکانت توی صف انجام می‌شه و کپشن رسید بعداً ویرایش می‌شه
+            message = callback.message if isinstance(callback.message, Message) else None
+            job = ProvisionJob(
+                order_id,
+                tg_username,
+                tg_userfn,
+                chat_id=message.chat.id if message else ADMIN_TELEGRAM_ID,
+                message_id=message.message_id if message else None,
+                caption=message.caption if message else None,
+            )
             try:
-                existing_user = await get_user_by_telegram_id(telegram_id)
-                if existing_user:
-                    username = str(existing_user.get("username"))
-                    data_limit = int(plan["data_limit"])
-                    expire_days = int(plan["expire_days"])
-                    users = plan["users"]
-                    user_info = await renew_user(
-                        telegram_id,
-                        username,
-                        data_limit,
-                        expire_days,
-                        users,
-                    )
-                else:
-                    username = (
-                        f"{tg_userfn}: @{tg_username}"
-                        if tg_username and tg_userfn
-                        else f"user_{uuid.uuid4().hex[:8]}"
-                    )
-                    data_limit = int(plan["data_limit"])
-                    expire_days = int(plan["expire_days"])
-                    users = plan["users"]
-                    user_info = await create_user(
-                        telegram_id,
-                        username,
-                        data_limit,
-                        expire_days,
-                        users,
-                    )
-
-                if user_info:
-                    await update_order(
-                        order_id, {"status": "confirmed", "telegram_id": telegram_id}
-                    )
-                    message_text = (
-                        (
-                            f"✅ **تمدید اکانت شما تأیید شد!** 🎉\n"
-                            f"👤 **نام کاربری**: {username}\n"
-                            f"📈 **حجم**: {data_limit / 1073741824 if data_limit else '♾️ نامحدود'} گیگابایت\n"
-                            f"⏳ **مدت**: {expire_days if expire_days else 'لایف‌تایم'} روز\n"
-                            f"🔗 **لینک اشتراک**: {user_info['subscription_url']}\n"
-                            f"لطفاً این لینک رو ذخیره کن یا از /getlink برای دریافت مجدد استفاده کن."
-                        )
-                        if existing_user or is_renewal
-                        else (
-                            f"✅ **سفارش شما تأیید شد!** 🎉\n"
-                            f"👤 **نام کاربری**: {username}\n"
-                            f"📈 **حجم**: {data_limit / 1073741824 if data_limit else '♾️ نامحدود'} گیگابایت\n"
-                            f"⏳ **مدت**: {expire_days if expire_days else 'لایف‌تایم'} روز\n"
-                            f"🔗 **لینک اشتراک**: {user_info['subscription_url']}\n"
-                            f"لطفاً این لینک رو ذخیره کن یا از /getlink برای دریافت مجدد استفاده کن."
-                        )
-                    )
-                    (
-                        await bot.send_message(
-                            telegram_id,
-                            message_text,
-                            parse_mode="markdown",
-                            reply_markup=get_main_menu(),
-                        )
-                        if not is_admin_user
-                        else await bot.send_message(
-                            telegram_id,
-                            message_text,
-                            parse_mode="markdown",
-                            reply_markup=get_admin_menu(),
-                        )
-                    )
-                    if (
-                        isinstance(callback.message, Message)
-                        and callback.message.caption
-                    ):
-                        await callback.message.edit_caption(
-                            caption=callback.message.caption
-                            + "\n\n✅ **وضعیت**: تأیید شده",
-                            parse_mode="Markdown",
-                        )
-                    await callback.answer(
-                        "سفارش تأیید شد و اکانت برای کاربر ایجاد/تمدید شد!"
-                    )
-                else:
-                    logger.error(
-                        f"Failed to {'renew' if existing_user else 'create'} user for order {order_id}: {user_info}"
-                    )
-                    await callback.answer(
-                        f"خطا در {'تمدید' if existing_user else 'ایجاد'} اکانت: {user_info}",
-                        show_alert=True,
-                    )
-            except Exception as e:
-                logger.error(f"Failed to confirm order {order_id}: {e}")
+                provisioning_queue.submit(job)
+            except asyncio.QueueFull:
+                logger.warning(f"Provisioning queue is full, order {order_id} not queued")
                 await callback.answer(
-                    f"❌ خطا در تأیید سفارش: {str(e)}", show_alert=True
-                )
-        else:
-            try:
-                await update_order(
-                    order_id, {"status": "rejected", "telegram_id": telegram_id}
+                    "❌ صف پردازش پر است، لطفاً کمی بعد دوباره تلاش کن.",
+                    show_alert=True,
                 )
-                await bot.send_message(
-                    telegram_id,
-                    f"{'تمدید' if is_renewal else 'سفارش'} *{order_id}* توسط ادمین رد شد. 😔",
-                    parse_mode="markdown",
-                )
-                if isinstance(callback.message, Message) and callback.message.caption:
-                    await callback.message.edit_caption(
-                        caption=callback.message.caption + "\n\n❌ **وضعیت**: رد شده",
-                        parse_mode="Markdown",
-                    )
-                await callback.answer("سفارش رد شد!")
-            except Exception as e:
-                logger.error(f"Failed to reject order {order_id}: {e}")
-                await callback.answer(f"❌ خطا در رد سفارش: {str(e)}", show_alert=True)
+                return
+            await callback.answer("⏳ سفارش در صف تأیید قرار گرفت.")
+            return
+
+        await reject_order(callback, order_id)
+
+
+async def reject_order(callback: CallbackQuery, order_id: str):
+    try:
+        result = await reject_pending_order(order_id)
+    except ProvisioningError as e:
+        await callback.answer(f"❌ {e}", show_alert=True)
+        return
+    except Exception as e:
+        logger.error(f"Failed to reject order {order_id}: {e}")
+        await callback.answer(f"❌ خطا در رد سفارش: {str(e)}", show_alert=True)
+        return
+    if result != "rejected":
+        await callback.answer(
+            ALREADY_PROCESSED_TEXT[result.removeprefix("already_")], show_alert=True
+        )
+        return
+
+    try:
+        if isinstance(callback.message, Message) and callback.message.caption:
+            await callback.message.edit_caption(
+                caption=callback.message.caption + "\n\n❌ **وضعیت**: رد شده",
+                parse_mode="Markdown",
+            )
+    except Exception as e:
+        logger.error(f"Failed to update receipt caption for order {order_id}: {e}")
+    await callback.answer("سفارش رد شد!")
@@ -13,20 +13,19 @@ from keyboards.main_menu import (
     get_main_menu_inline,
 )
 from keyboards.renew_menu import get_renew_menu, get_renew_plan_menu
-from services.check_channel_membership import check_channel_membership
+from middlewares.user_context import UserContext, has_user_context
 from services.order_service import save_order
-from services.user_service import get_user_by_telegram_id
 from utils.logger import logger
 from utils.plans import get_plan_by_id
 
-from .admin import is_admin
-
 router = Router()
+router.message.filter(has_user_context)
+router.callback_query.filter(has_user_context)
 
 
 @router.message(Command("renew"))
 @router.message(F.text == "🔄 تمدید اکانت")
-async def renew_command(message: Message, bot: Bot):
+async def renew_command(message: Message, bot: Bot, ctx: UserContext):
     if not message.from_user:
         await message.reply(
             "❌ *خطا: کاربر نامشخص است!*",
@@ -34,17 +33,17 @@ async def renew_command(message: Message, bot: Bot):
             reply_markup=get_main_menu(),
         )
         return
-    user_id = message.from_user.id
-    is_admin_user = await is_admin(user_id)
+    user_id = ctx.user_id
+    is_admin_user = ctx.is_admin
     logger.info(f"Renew command received from user {user_id}")
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         await message.reply(
             f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
             parse_mode="Markdown",
             reply_markup=get_channel_join_keyboard(),
         )
         return
-    user = await get_user_by_telegram_id(user_id)
+    user = ctx.user
     if not user:
         (
             await message.reply(
@@ -68,7 +67,7 @@ async def renew_command(message: Message, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data == "main_renew")
-async def main_renew(callback: CallbackQuery, bot: Bot):
+async def main_renew(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.debug(f"Received callback: main_renew from user {callback.from_user.id}")
     if isinstance(callback.message, Message):
         try:
@@ -78,10 +77,9 @@ async def main_renew(callback: CallbackQuery, bot: Bot):
     else:
         logger.warning("Callback message is not a Message instance, cannot delete.")
 
-    user_id = callback.from_user.id
-    is_admin_user = await is_admin(user_id)
+    is_admin_user = ctx.is_admin
 
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         if callback.message:
             await callback.message.answer(
                 f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
@@ -90,7 +88,7 @@ async def main_renew(callback: CallbackQuery, bot: Bot):
             )
             await callback.answer()
             return
-    user = await get_user_by_telegram_id(user_id)
+    user = ctx.user
     if not user:
         if callback.message:
             (
@@ -118,14 +116,13 @@ async def main_renew(callback: CallbackQuery, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data.startswith("renew_"))
-async def process_renew_type(callback: CallbackQuery, bot: Bot):
+async def process_renew_type(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.info(
         f"Received renew callback: {callback.data} from user {callback.from_user.id}"
     )
-    user_id = callback.from_user.id
-    is_admin_user = await is_admin(user_id)
+    is_admin_user = ctx.is_admin
 
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         if callback.message:
             await callback.message.answer(
                 f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
@@ -179,13 +176,13 @@ async def process_renew_type(callback: CallbackQuery, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data.startswith("renewselect_"))
-async def process_renew_plan_selection(callback: CallbackQuery, bot: Bot):
+async def process_renew_plan_selection(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.info(
         f"Received renewselect callback: {callback.data} from user {callback.from_user.id}"
     )
     user_id = callback.from_user.id
-    is_admin_user = await is_admin(user_id)
-    if not await check_channel_membership(bot, user_id):
+    is_admin_user = ctx.is_admin
+    if not ctx.is_member:
         if callback.message:
             await callback.message.answer(
                 f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
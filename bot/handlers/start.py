@@ -13,21 +13,21 @@ from keyboards.main_menu import (
     get_channel_join_keyboard,
     get_main_menu,
 )
+from middlewares.user_context import UserContext, has_user_context
 from services.check_channel_membership import check_channel_membership
 from utils.logger import logger
 
-from .admin import is_admin
-
 router = Router()
+router.message.filter(has_user_context)
+router.callback_query.filter(has_user_context)
 
 
 @router.message(Command("start"))
-async def start_command(message: Message, bot: Bot):
+async def start_command(message: Message, bot: Bot, ctx: UserContext):
     if message.from_user is None:
         await message.reply("خطا: کاربر شناسایی نشد. لطفاً دوباره تلاش کنید.")
         return
-    user_id = message.from_user.id
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         await message.reply(
             "🎉 *به ربات IRVPN خوش اومدی!* 😊\n"
             "برای استفاده از خدمات ما، لطفاً ابتدا توی کانالممون عضو شو:\n"
@@ -38,7 +38,7 @@ async def start_command(message: Message, bot: Bot):
         )
         return
 
-    is_admin_user = await is_admin(user_id)
+    is_admin_user = ctx.is_admin
     reply = (
         "*به ربات IRVPN خوش اومدی!* 😊\n"
         "لطفاً یکی از گزینه‌های زیر رو انتخاب کن:\n\n"
@@ -59,7 +59,7 @@ async def start_command(message: Message, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data == "check_membership")
-async def check_membership(callback: CallbackQuery, bot: Bot):
+async def check_membership(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.debug(
         f"Received callback: check_membership from user {callback.from_user.id}"
     )
@@ -76,8 +76,9 @@ async def check_membership(callback: CallbackQuery, bot: Bot):
 
     user_id = callback.from_user.id
 
-    if await check_channel_membership(bot, user_id):
-        is_admin_user = await is_admin(user_id)
+    # کاربر تازه عضو شده؛ اینجا کش عضویت رو دور می‌زنیم
+    if await check_channel_membership(bot, user_id, use_cache=False):
+        is_admin_user = ctx.is_admin
         reply = (
             "*خوش اومدی!* 🎉\n"
             "حالا می‌تونی از خدمات ربات استفاده کنی. یه گزینه رو انتخاب کن:\n\n"
@@ -108,12 +109,11 @@ async def check_membership(callback: CallbackQuery, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data.startswith("main_"))
-async def process_main_type(callback: CallbackQuery, bot: Bot):
+async def process_main_type(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.info(
         f"Received main callback: {callback.data} from user {callback.from_user.id}"
     )
-    user_id = callback.from_user.id
-    if not await check_channel_membership(bot, user_id):
+    if not ctx.is_member:
         if callback.message:
             await callback.message.answer(
                 f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
@@ -131,7 +131,7 @@ async def process_main_type(callback: CallbackQuery, bot: Bot):
                 match category:
                     case "status":
                         try:
-                            await status_command(callback.message, bot)
+                            await status_command(callback.message, bot, ctx)
                         except Exception as e:
                             logger.error(f"Error in main_status: {str(e)}")
                             if callback.message:
@@ -141,7 +141,7 @@ async def process_main_type(callback: CallbackQuery, bot: Bot):
                                 )
                     case "buy":
                         try:
-                            await buy_command(callback.message, bot)
+                            await buy_command(callback.message, bot, ctx)
                         except Exception as e:
                             logger.error(f"Error in main_buy: {str(e)}")
                             if callback.message:
@@ -151,7 +151,7 @@ async def process_main_type(callback: CallbackQuery, bot: Bot):
                                 )
                     case "renew":
                         try:
-                            await renew_command(callback.message, bot)
+                            await renew_command(callback.message, bot, ctx)
                         except Exception as e:
                             logger.error(f"Error in main_renew: {str(e)}")
                             if callback.message:
@@ -161,7 +161,7 @@ async def process_main_type(callback: CallbackQuery, bot: Bot):
                                 )
                     case "getlink":
                         try:
-                            await getlink_command(callback.message, bot)
+                            await getlink_command(callback.message, bot, ctx)
                         except Exception as e:
                             logger.error(f"Error in main_getlink: {str(e)}")
                             if callback.message:
@@ -171,7 +171,7 @@ async def process_main_type(callback: CallbackQuery, bot: Bot):
                                 )
                     case "adduser":
                         try:
-                            await adduser_command(callback.message, bot)
+                            await adduser_command(callback.message, bot, ctx)
                         except Exception as e:
                             logger.error(f"Error in main_adduser: {str(e)}")
                             if callback.message:
@@ -181,7 +181,7 @@ async def process_main_type(callback: CallbackQuery, bot: Bot):
                                 )
                     case "servers":
                         try:
-                            await servers_command(callback.message, bot)
+                            await servers_command(callback.message, bot, ctx)
                         except Exception as e:
                             logger.error(f"Error in main_servers: {str(e)}")
                             if callback.message:
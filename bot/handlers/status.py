@@ -4,19 +4,18 @@ from aiogram.filters import Command
 from aiogram.types import CallbackQuery, Message
 from config import CHANNEL_ID
 from keyboards.main_menu import get_admin_menu, get_channel_join_keyboard, get_main_menu
-from services.check_channel_membership import check_channel_membership
-from services.user_service import get_user_by_telegram_id
+from middlewares.user_context import UserContext, has_user_context
 from utils.formatters import format_data_limit, format_expire_date
 from utils.logger import logger
 
-from .admin import is_admin
-
 router = Router()
+router.message.filter(has_user_context)
+router.callback_query.filter(has_user_context)
 
 
 @router.message(Command("status"))
 @router.message(F.text == "📊 وضعیت اکانت")
-async def status_command(message: Message, bot: Bot):
+async def status_command(message: Message, bot: Bot, ctx: UserContext):
     if not message.from_user:
         await message.reply(
             "❌ *خطا: کاربر نامشخص است!*",
@@ -24,9 +23,9 @@ async def status_command(message: Message, bot: Bot):
             reply_markup=get_main_menu(),
         )
         return
-    user_id = message.from_user.id
-    is_admin_user = await is_admin(user_id)
-    if not await check_channel_membership(bot, user_id):
+    user_id = ctx.user_id
+    is_admin_user = ctx.is_admin
+    if not ctx.is_member:
         await message.reply(
             f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
             parse_mode="Markdown",
@@ -34,7 +33,7 @@ async def status_command(message: Message, bot: Bot):
         )
         return
     try:
-        user = await get_user_by_telegram_id(user_id)
+        user = ctx.user
         if not user:
             (
                 await message.answer(
@@ -89,7 +88,7 @@ async def status_command(message: Message, bot: Bot):
 
 
 @router.callback_query(lambda c: c.data == "main_status")
-async def main_status(callback: CallbackQuery, bot: Bot):
+async def main_status(callback: CallbackQuery, bot: Bot, ctx: UserContext):
     logger.debug(f"Received callback: main_status from user {callback.from_user.id}")
     if isinstance(callback.message, Message):
         try:
@@ -100,8 +99,8 @@ async def main_status(callback: CallbackQuery, bot: Bot):
         logger.warning("Callback message is not a Message instance, cannot delete.")
 
     user_id = callback.from_user.id
-    is_admin_user = await is_admin(user_id)
-    if not await check_channel_membership(bot, user_id):
+    is_admin_user = ctx.is_admin
+    if not ctx.is_member:
         if callback.message is not None:
             await callback.message.answer(
                 f"⚠️ *لطفاً ابتدا در کانال ما عضو شوید*: {CHANNEL_ID}",
@@ -111,7 +110,7 @@ async def main_status(callback: CallbackQuery, bot: Bot):
         await callback.answer()
         return
     try:
-        user = await get_user_by_telegram_id(user_id)
+        user = ctx.user
         if not user:
             if callback.message is not None:
                 (
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
@@ -13,7 +13,7 @@ def get_receipt_admin_menu(
             [
                 InlineKeyboardButton(
                     text="✅ تأیید",
-                    callback_data=f"confirm_{order_id}/{tg_username or ''}/{tg_userfn_clean or ''}",
+                    callback_data=f"confirm/{order_id}/{tg_username or ''}/{tg_userfn_clean or ''}",
                 )
             ],
             [
@@ -24,3 +24,34 @@ def get_receipt_admin_menu(
             ],
         ]
     )
+
+
+def get_batch_review_menu(
+    orders: List[List[str]], selected: List[str]
+) -> InlineKeyboardMarkup:
+    rows = [
+        [
+            InlineKeyboardButton(
+                text=f"{'☑️' if order_id in selected else '⬜'} {label}",
+                callback_data=f"batch/toggle/{order_id}",
+            )
+        ]
+        for order_id, label in orders
+    ]
+    rows.append(
+        [
+            InlineKeyboardButton(text="🔘 انتخاب همه", callback_data="batch/all"),
+            InlineKeyboardButton(text="🚫 انصراف", callback_data="batch/cancel"),
+        ]
+    )
+    rows.append(
+        [
+            InlineKeyboardButton(
+                text=f"✅ تأیید ({len(selected)})", callback_data="batch/confirm"
+            ),
+            InlineKeyboardButton(
+                text=f"❌ رد ({len(selected)})", callback_data="batch/reject"
+            ),
+        ]
+    )
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -1,26 +1,150 @@
 import asyncio
+import signal
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from config import (
+    BOT_MODE,
+    BOT_TOKEN,
+    DB_EVENTS,
+    FSM_STORAGE,
+    RUN_BACKGROUND_TASKS,
+    UPDATE_QUEUE_SIZE,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+)
 from handlers.admin import router as admin_router
 from handlers.buy import router as buy_router
 from handlers.getlink import router as getlink_router
+from handlers.membership import router as membership_router
 from handlers.receipt import router as receipt_router
 from handlers.renew import router as renew_router
 from handlers.start import router as start_router
 from handlers.status import router as status_router
 from middlewares.log_all_callbacks import LogAllCallbackMiddleware
-from services.background_tasks import check_expiring_users, check_pending_orders
+from middlewares.update_pool import update_pool
+from middlewares.user_context import LoadUserContextMiddleware
+from services.api_client import APIClient
+from services.background_tasks import (
+    check_expiring_users,
+    check_pending_orders,
+    provision_verified_orders,
+)
+from services.db_events import db_events
+from services.provisioning import provisioning_queue
+from services.send_queue import send_queue
+from storage.memory import BoundedMemoryStorage
+from storage.postgres import PostgresStorage
+from utils.db import close_pool
 from utils.logger import logger
+from utils.marzban import token_manager
+
+HEALTH_PATH = "/healthz"
+
+
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
+    token_manager.start()
+    send_queue.start(bot)
+    provisioning_queue.start(bot)
+    # با چند replica فقط یکی باید کارهای دوره‌ای رو اجرا کنه
+    if RUN_BACKGROUND_TASKS:
+        asyncio.create_task(check_pending_orders(bot))
+        asyncio.create_task(check_expiring_users(bot))
+        # با LISTEN/NOTIFY سفارش‌های verified همون لحظه می‌رسن و polling لازم نیست
+        if not DB_EVENTS:
+            asyncio.create_task(provision_verified_orders(bot))
+    if DB_EVENTS:
+        db_events.start(background=RUN_BACKGROUND_TASKS)
+    if BOT_MODE == "webhook":
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook set to {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+
+async def on_shutdown():
+    await db_events.close()
+    await provisioning_queue.close()
+    await send_queue.close()
+    await token_manager.close()
+    await APIClient.close()
+    await close_pool()
+
+
+def create_storage() -> BaseStorage:
+    if FSM_STORAGE == "postgres":
+        return PostgresStorage()
+    return BoundedMemoryStorage()
+
+
+async def healthz(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok", "mode": BOT_MODE})
+
+
+async def run_polling(bot: Bot, dp: Dispatcher):
+    await bot.delete_webhook(drop_pending_updates=True)
+    # سقف آپدیت‌های در جریان؛ وقتی پر بشه polling صبر می‌کنه
+    await dp.start_polling(
+        bot,
+        allowed_updates=dp.resolve_used_update_types(),
+        tasks_concurrency_limit=UPDATE_QUEUE_SIZE,
+    )
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    if not WEBHOOK_URL or not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_URL and WEBHOOK_SECRET are required in webhook mode")
+    app = web.Application()
+    app.router.add_get(HEALTH_PATH, healthz)
+    # آپدیت داخل همین درخواست پردازش می‌شه تا max_connections سقف همزمانی باشه
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=WEBHOOK_SECRET,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    # aiogram فقط در polling سیگنال‌ها رو می‌گیره؛ بدون این docker stop پروسه رو
+    # می‌کشه و on_shutdown (خالی کردن صف‌ها، بستن storage و pool ها) اجرا نمی‌شه
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        site = web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT)
+        await site.start()
+        logger.info(f"Webhook server listening on {WEBAPP_HOST}:{WEBAPP_PORT}")
+        await stop.wait()
+        logger.info("Stop signal received, shutting down webhook server...")
+    finally:
+        # cleanup اول سرور رو می‌بنده و بعد dispatcher shutdown رو اجرا می‌کنه
+        await runner.cleanup()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
 
 
 async def main():
     bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = Dispatcher(storage=create_storage())
 
     dp.update.outer_middleware.register(LogAllCallbackMiddleware())
+    dp.update.outer_middleware.register(update_pool)
+    dp.update.outer_middleware.register(LoadUserContextMiddleware())
 
+    dp.include_router(membership_router)
     dp.include_router(start_router)
     dp.include_router(buy_router)
     dp.include_router(renew_router)
@@ -29,12 +153,15 @@ async def main():
     dp.include_router(admin_router)
     dp.include_router(receipt_router)
 
-    asyncio.create_task(check_pending_orders(bot))
-    asyncio.create_task(check_expiring_users(bot))
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
-    logger.info("Starting bot...")
+    logger.info(f"Starting bot in {BOT_MODE} mode with {FSM_STORAGE} FSM storage...")
     try:
-        await dp.start_polling(bot, skip_updates=True)
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await run_polling(bot, dp)
     except Exception as e:
         logger.error(f"Bot failed: {str(e)}")
     finally:
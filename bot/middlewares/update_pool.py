@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import Chat, TelegramObject, User
+from config import UPDATE_QUEUE_SIZE, UPDATE_WORKERS
+from utils.logger import logger
+
+
+class UpdateQueueFullError(Exception):
+    pass
+
+
+class UpdatePoolMiddleware(BaseMiddleware):
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._semaphore = asyncio.Semaphore(workers)
+        # برای هر چت یک قفل FIFO تا آپدیت‌های یک کاربر به ترتیب اجرا بشن
+        self._chats: Dict[int, List] = {}
+        self.waiting = 0
+        self.active = 0
+        self.processed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _chat_key(self, data: Dict[str, Any]) -> Optional[int]:
+        chat: Optional[Chat] = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        user: Optional[User] = data.get("event_from_user")
+        return user.id if user is not None else None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self.waiting >= self.queue_size:
+            self.rejected += 1
+            # در حالت webhook تلگرام آپدیت رو بعداً دوباره می‌فرسته
+            raise UpdateQueueFullError(
+                f"Update queue is full ({self.waiting} waiting)"
+            )
+        key = self._chat_key(data)
+        entry = self._chats.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        enqueued_at = time.monotonic()
+        self.waiting += 1
+        started = False
+        try:
+            async with entry[0], self._semaphore:
+                started = True
+                self.waiting -= 1
+                self.active += 1
+                wait = time.monotonic() - enqueued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                if wait > 1:
+                    logger.warning(
+                        f"Update for chat {key} waited {wait:.2f}s in queue"
+                    )
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.active -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                self.waiting -= 1
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[key]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "waiting": self.waiting,
+            "queue_size": self.queue_size,
+            "chats": len(self._chats),
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / self.processed * 1000, 1)
+            if self.processed
+            else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+update_pool = UpdatePoolMiddleware(UPDATE_WORKERS, UPDATE_QUEUE_SIZE)
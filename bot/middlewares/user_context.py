@@ -0,0 +1,52 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import Bot
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+from services.check_channel_membership import check_channel_membership
+from services.user_service import get_user_by_telegram_id, is_admin
+
+
+@dataclass
+class UserContext:
+    user_id: int
+    is_admin: bool
+    is_member: bool
+    user: Optional[dict]
+
+
+async def has_user_context(event: TelegramObject, ctx: Optional[UserContext]) -> bool:
+    # برای آپدیت‌های بدون کاربر (مثلاً پیام از طرف کانال) ctx برابر None است
+    return ctx is not None
+
+
+class LoadUserContextMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user: Optional[User] = data.get("event_from_user")
+        if (
+            from_user is None
+            or not isinstance(event, Update)
+            or not (event.message or event.callback_query)
+        ):
+            # ctx همیشه هست تا هندلرها با has_user_context رد بشن، نه با خطای آرگومان
+            data["ctx"] = None
+            return await handler(event, data)
+        bot: Bot = data["bot"]
+        is_member, user = await asyncio.gather(
+            check_channel_membership(bot, from_user.id),
+            get_user_by_telegram_id(from_user.id),
+        )
+        data["ctx"] = UserContext(
+            user_id=from_user.id,
+            is_admin=await is_admin(from_user.id),
+            is_member=is_member,
+            user=user,
+        )
+        return await handler(event, data)
@@ -1,65 +1,235 @@
-from typing import Optional
+import asyncio
+import random
+from typing import AsyncIterator, Dict, Optional, Tuple
 
-import requests
-from config import DJANGO_API_URL
+import aiohttp
+from config import (
+    API_PAGE_SIZE,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+    DJANGO_API_URL,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_RETRIES,
+    HTTP_RETRY_BASE_DELAY,
+    HTTP_RETRY_MAX_DELAY,
+    HTTP_TIMEOUT,
+)
+from utils.circuit_breaker import STATE_CLOSED, CircuitBreaker
 from utils.logger import logger
 
+# فقط درخواست‌هایی که تکرارشون بی‌خطره دوباره ارسال می‌شن
+RETRY_METHODS = ("GET", "PUT")
+
+
+def is_backend_failure(error: Exception) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
 
 class APIClient:
+    # یک session با connection pool مجزا برای هر base_url (Django و Marzban)
+    _sessions: Dict[str, aiohttp.ClientSession] = {}
+    # GETهای یکسانی که همزمان در جریان هستن فقط یک بار ارسال می‌شن
+    _inflight: Dict[Tuple, asyncio.Task] = {}
+    _breakers: Dict[str, CircuitBreaker] = {}
+    sent = 0
+    coalesced = 0
+    retried = 0
+
+    @classmethod
+    def _get_session(cls, base_url: str) -> aiohttp.ClientSession:
+        session = cls._sessions.get(base_url)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            )
+            cls._sessions[base_url] = session
+            logger.debug(f"HTTP session opened for {base_url}")
+        return session
+
+    @classmethod
+    def _get_breaker(cls, base_url: str) -> CircuitBreaker:
+        breaker = cls._breakers.get(base_url)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                base_url, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+            )
+            cls._breakers[base_url] = breaker
+        return breaker
+
     @staticmethod
-    async def get(
+    def _freeze(values: Optional[dict]) -> Tuple:
+        return tuple(sorted((k, str(v)) for k, v in (values or {}).items()))
+
+    @classmethod
+    async def request(
+        cls,
+        method: str,
         url: str,
         params: dict = None,
+        json: dict = None,
+        data: dict = None,
         headers: dict = None,
         base_url: Optional[str] = DJANGO_API_URL,
     ):
-        try:
-            response = requests.get(
-                f"{base_url}{url}",
-                params=params,
-                headers=headers,
-                timeout=5,
-                verify=True,
+        if method != "GET":
+            return await cls._send(method, url, params, json, data, headers, base_url)
+        key = (str(base_url), url, cls._freeze(params), cls._freeze(headers))
+        task = cls._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                cls._send(method, url, params, None, None, headers, base_url)
             )
-            response.raise_for_status()
-            logger.debug(f"GET request successful: {url}")
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API GET request failed: {url}, error: {e}")
-            raise
+            cls._inflight[key] = task
+            task.add_done_callback(
+                lambda done: cls._inflight.pop(key, None)
+                if cls._inflight.get(key) is done
+                else None
+            )
+        else:
+            cls.coalesced += 1
+            logger.debug(f"GET request coalesced with in-flight request: {url}")
+        # shield: لغو شدن یکی از منتظرها نباید درخواست بقیه رو لغو کنه
+        return await asyncio.shield(task)
 
-    @staticmethod
+    @classmethod
+    async def _send(
+        cls,
+        method: str,
+        url: str,
+        params: Optional[dict],
+        json: Optional[dict],
+        data: Optional[dict],
+        headers: Optional[dict],
+        base_url: Optional[str],
+    ):
+        session = cls._get_session(str(base_url))
+        breaker = cls._get_breaker(str(base_url))
+        retries = HTTP_RETRIES if method in RETRY_METHODS else 0
+        attempt = 0
+        while True:
+            # وقتی بک‌اند از دسترس خارجه بدون صبر برای timeout خطا می‌دیم
+            breaker.check()
+            cls.sent += 1
+            try:
+                async with session.request(
+                    method,
+                    f"{base_url}{url}",
+                    params=params,
+                    json=json,
+                    data=data,
+                    headers=headers,
+                ) as response:
+                    response.raise_for_status()
+                    result = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                failed = is_backend_failure(e)
+                if failed:
+                    breaker.record_failure()
+                else:
+                    # خطای 4xx یعنی بک‌اند سالمه
+                    breaker.record_success()
+                if failed and attempt < retries and breaker.state == STATE_CLOSED:
+                    attempt += 1
+                    cls.retried += 1
+                    delay = random.uniform(
+                        0, min(HTTP_RETRY_MAX_DELAY, HTTP_RETRY_BASE_DELAY * 2**attempt)
+                    )
+                    logger.warning(
+                        f"API {method} request failed: {url}, error: {e}, retrying in {delay:.2f}s"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+                logger.error(f"API {method} request failed: {url}, error: {e}")
+                raise
+            breaker.record_success()
+            logger.debug(f"{method} request successful: {url}")
+            return result
+
+    @classmethod
+    async def get(
+        cls,
+        url: str,
+        params: dict = None,
+        headers: dict = None,
+        base_url: Optional[str] = DJANGO_API_URL,
+    ):
+        return await cls.request(
+            "GET", url, params=params, headers=headers, base_url=base_url
+        )
+
+    @classmethod
+    async def iter_pages(
+        cls,
+        url: str,
+        params: dict = None,
+        limit: int = API_PAGE_SIZE,
+        base_url: Optional[str] = DJANGO_API_URL,
+    ) -> AsyncIterator[dict]:
+        # صفحه‌ها با cursor یکی‌یکی گرفته می‌شن و هر لحظه فقط یک صفحه در حافظه‌ست
+        params = {**(params or {}), "limit": limit}
+        while True:
+            page = await cls.get(url, params=params, base_url=base_url)
+            for item in page["results"]:
+                yield item
+            if page["next_cursor"] is None:
+                return
+            params["cursor"] = page["next_cursor"]
+
+    @classmethod
     async def post(
+        cls,
         url: str,
         data: dict,
         headers: dict = None,
         base_url: Optional[str] = DJANGO_API_URL,
     ):
-        try:
-            response = requests.post(
-                f"{base_url}{url}", json=data, headers=headers, timeout=5, verify=True
-            )
-            response.raise_for_status()
-            logger.debug(f"POST request successful: {url}")
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API POST request failed: {url}, error: {e}")
-            raise
+        return await cls.request(
+            "POST", url, json=data, headers=headers, base_url=base_url
+        )
 
-    @staticmethod
+    @classmethod
     async def put(
+        cls,
         url: str,
         data: dict,
         headers: dict = None,
         base_url: Optional[str] = DJANGO_API_URL,
     ):
-        try:
-            response = requests.put(
-                f"{base_url}{url}", json=data, headers=headers, timeout=5, verify=True
-            )
-            response.raise_for_status()
-            logger.debug(f"PUT request successful: {url}")
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API PUT request failed: {url}, error: {e}")
-            raise
+        return await cls.request(
+            "PUT", url, json=data, headers=headers, base_url=base_url
+        )
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "sent": cls.sent,
+            "coalesced": cls.coalesced,
+            "retried": cls.retried,
+            "inflight": len(cls._inflight),
+            "sessions": len(cls._sessions),
+        }
+
+    @classmethod
+    def breaker_stats(cls) -> dict:
+        return {
+            base_url: ", ".join(f"{k}={v}" for k, v in breaker.stats().items())
+            for base_url, breaker in cls._breakers.items()
+        }
+
+    @classmethod
+    async def close(cls):
+        for base_url, session in list(cls._sessions.items()):
+            if not session.closed:
+                await session.close()
+                logger.debug(f"HTTP session closed for {base_url}")
+        cls._sessions.clear()
@@ -1,114 +1,204 @@
 import asyncio
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from config import DJANGO_API_URL
-from services.api_client import APIClient
-from services.order_service import update_order
-from services.user_service import get_subscription_info
+from config import (
+    ADMIN_TELEGRAM_ID,
+    EXPIRY_LOOKUP_BATCH_SIZE,
+    MARZBAN_USERS_PAGE_SIZE,
+    ORDER_EXPIRY_MINUTES,
+    VERIFIED_ORDERS_POLL_INTERVAL,
+)
+from services.notification_service import (
+    get_sent_expiry_notifications,
+    record_expiry_notifications,
+)
+from services.order_expiry import order_expiry
+from services.order_service import (
+    expire_pending_orders,
+    get_orders_by_status,
+    iter_orders_by_status,
+)
+from services.provisioning import PROCESSED_ORDER_TTL, process_orders
+from services.send_queue import PRIORITY_ADMIN, PRIORITY_BULK, send_queue
+from services.user_service import get_users_by_usernames
+from utils.cache import TTLCache
 from utils.logger import logger
+from utils.marzban import iter_marzban_users
+
+EXPIRY_WARNING_DAYS = (1, 3, 7)
+
+
+async def seed_order_expiry():
+    while True:
+        try:
+            async for order in iter_orders_by_status(
+                "pending", fields=["order_id", "created_at", "receipt_url"]
+            ):
+                order_expiry.schedule_order(order)
+            logger.info(f"Order expiry scheduler seeded with {len(order_expiry)} orders")
+            return
+        except Exception as e:
+            logger.error(f"Failed to seed order expiry scheduler: {e}")
+            await asyncio.sleep(60)
 
 
 async def check_pending_orders(bot):
+    await seed_order_expiry()
     while True:
+        await order_expiry.wait_next()
+        due = order_expiry.pop_due(time.time())
+        if not due:
+            continue
         try:
-            logger.info("Checking pending orders...")
-            orders = await APIClient.get(
-                "/orders/", params={"status": "pending"}, base_url=DJANGO_API_URL
-            )
-            now = datetime.now(ZoneInfo("UTC"))
-            for order in orders:
-                try:
-                    telegram_id = order.get("telegram_id")
-                    if not telegram_id or not isinstance(telegram_id, int):
-                        logger.error(f"Invalid or missing telegram_id for order {order.get('order_id', 'unknown')}")
-                        continue
-                    created_time = datetime.fromisoformat(
-                        order["created_at"].replace("Z", "+00:00")
-                    )
-                    if now - created_time > timedelta(minutes=30):
-                        try:
-                            await update_order(
-                                order["order_id"], 
-                                {"status": "rejected", "telegram_id": telegram_id}
-                            )
-                            await bot.send_message(
-                                telegram_id,
-                                f"سفارش *{order['order_id']}* به دلیل عدم ارسال رسید در 30 دقیقه لغو شد.",
-                                parse_mode="Markdown",
-                            )
-                            logger.info(
-                                f"Order {order['order_id']} rejected and user {telegram_id} notified"
-                            )
-                        except Exception as e:
-                            logger.error(
-                                f"Failed to reject order {order['order_id']} or notify user {telegram_id}: {e}"
-                            )
-                except Exception as e:
-                    logger.error(
-                        f"Error processing order {order.get('order_id', 'unknown')}: {e}"
-                    )
+            expired = await expire_pending_orders(ORDER_EXPIRY_MINUTES, order_ids=due)
         except Exception as e:
-            logger.error(f"Error checking pending orders: {e}")
-        logger.info("Finished checking pending orders, sleeping for 1 minute...")
-        await asyncio.sleep(60)
+            logger.error(f"Error expiring pending orders {due}: {e}")
+            for order_id in due:
+                order_expiry.schedule(order_id, time.time() + 60)
+            continue
+        for order in expired:
+            telegram_id = order.get("telegram_id")
+            if not telegram_id or not isinstance(telegram_id, int):
+                logger.error(
+                    f"Invalid or missing telegram_id for order {order.get('order_id', 'unknown')}"
+                )
+                continue
+            try:
+                await send_queue.send_message(
+                    telegram_id,
+                    f"سفارش *{order['order_id']}* به دلیل عدم ارسال رسید در {ORDER_EXPIRY_MINUTES} دقیقه لغو شد.",
+                    parse_mode="Markdown",
+                )
+                logger.info(
+                    f"Order {order['order_id']} rejected and user {telegram_id} notified"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Failed to notify user {telegram_id} about order {order['order_id']}: {e}"
+                )
+
+
+async def provision_verified_orders(bot):
+    # سفارش‌هایی که از پنل Django تأیید پرداخت شدن اینجا اکانتشون ساخته می‌شه؛
+    # سفارش‌های ناموفق تا یک ساعت دوباره امتحان نمی‌شن تا ادمین پیام تکراری نگیره
+    failed_orders = TTLCache(1000, PROCESSED_ORDER_TTL)
+    while True:
+        try:
+            orders = await get_orders_by_status("verified", fields=["order_id"])
+            order_ids = [
+                order["order_id"]
+                for order in orders
+                if order["order_id"] not in failed_orders
+            ]
+            if order_ids:
+                result = await process_orders(order_ids, "confirm")
+                for order_id in result.failed:
+                    failed_orders.set(order_id, True)
+                await send_queue.send_message(
+                    ADMIN_TELEGRAM_ID,
+                    result.summary(),
+                    priority=PRIORITY_ADMIN,
+                    parse_mode="Markdown",
+                )
+        except Exception as e:
+            logger.error(f"Error provisioning verified orders: {e}")
+        await asyncio.sleep(VERIFIED_ORDERS_POLL_INTERVAL)
+
+
+async def notify_expiring_users(candidates: list) -> tuple:
+    # فقط همین چند username از Django و دفتر هشدارها پرسیده می‌شن؛
+    # اگه این دسته خطا بده فقط همین دسته رد می‌شه و sweep ادامه پیدا می‌کنه
+    usernames = [username for username, _, _ in candidates]
+    try:
+        users = await get_users_by_usernames(
+            usernames, fields=["username", "telegram_id"]
+        )
+        sent = await get_sent_expiry_notifications(usernames)
+    except Exception as e:
+        logger.error(f"Failed to look up {len(usernames)} expiring users: {e}")
+        return 0, 0, len(candidates)
+    telegram_ids = {user["username"]: user.get("telegram_id") for user in users}
+    matched = skipped = 0
+    pending = []
+    for username, days_left, expire in candidates:
+        if username not in telegram_ids:
+            continue
+        matched += 1
+        telegram_id = telegram_ids[username]
+        if not telegram_id or not isinstance(telegram_id, int):
+            logger.warning(f"Invalid or missing telegram_id for user {username}")
+            continue
+        if (username, days_left, expire) in sent:
+            skipped += 1
+            continue
+        pending.append((telegram_id, username, days_left, expire))
+    results = await asyncio.gather(
+        *[
+            send_queue.send_message(
+                telegram_id,
+                f"اکانت شما (*{username}*) {days_left} روز دیگه منقضی می‌شه! "
+                "برای تمدید از /renew استفاده کنید.",
+                priority=PRIORITY_BULK,
+                parse_mode="Markdown",
+            )
+            for telegram_id, username, days_left, _ in pending
+        ],
+        return_exceptions=True,
+    )
+    notified = []
+    for (telegram_id, username, days_left, expire), result in zip(pending, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to send message to user {telegram_id}: {result}")
+            continue
+        notified.append(
+            {"username": username, "threshold": days_left, "expire": expire}
+        )
+        logger.info(
+            f"Sent expiration warning to user {telegram_id} ({days_left} days left)"
+        )
+    await record_expiry_notifications(notified)
+    return matched, skipped, 0
 
 
 async def check_expiring_users(bot):
     while True:
+        started = time.monotonic()
+        scanned = expiring = skipped = failed = 0
         try:
             logger.info("Checking expiring users...")
-            users = await APIClient.get("/users/", base_url=DJANGO_API_URL)
             now = datetime.now(ZoneInfo("UTC"))
-            for user in users:
-                try:
-                    telegram_id = user.get("telegram_id")
-                    if not telegram_id or not isinstance(telegram_id, int):
-                        logger.warning(
-                            f"Invalid or missing telegram_id for user {user.get('username', 'unknown')}"
-                        )
-                        continue
-                    if "subscription_token" not in user:
-                        logger.warning(
-                            f"User {telegram_id} has no subscription_token"
-                        )
-                        continue
-                    token = user["subscription_token"]
-                    if not token:
-                        logger.debug(
-                            f"Empty subscription_token for user {telegram_id}"
-                        )
-                        continue
-                    user_info = await get_subscription_info(token)
-                    if not user_info or not user_info.get("expire"):
-                        logger.debug(
-                            f"No expiration info for user {telegram_id}"
-                        )
-                        continue
-                    expire_time = datetime.fromtimestamp(
-                        user_info["expire"], tz=ZoneInfo("UTC")
-                    )
-                    days_left = (expire_time - now).days
-                    if days_left in [1, 3, 7]:
-                        try:
-                            await bot.send_message(
-                                telegram_id,
-                                f"اکانت شما (*{user['username']}*) {days_left} روز دیگه منقضی می‌شه! "
-                                "برای تمدید از /renew استفاده کنید.",
-                                parse_mode="Markdown",
-                            )
-                            logger.info(
-                                f"Sent expiration warning to user {telegram_id} ({days_left} days left)"
-                            )
-                        except Exception as e:
-                            logger.error(
-                                f"Failed to send message to user {telegram_id}: {e}"
-                            )
-                except Exception as e:
-                    logger.error(
-                        f"Error processing user {user.get('telegram_id', 'unknown')}: {e}"
-                    )
+            candidates = []
+            async for marzban_user in iter_marzban_users(MARZBAN_USERS_PAGE_SIZE):
+                scanned += 1
+                if not marzban_user.get("expire") or not marzban_user.get("username"):
+                    continue
+                expire_time = datetime.fromtimestamp(
+                    marzban_user["expire"], tz=ZoneInfo("UTC")
+                )
+                days_left = (expire_time - now).days
+                if days_left not in EXPIRY_WARNING_DAYS:
+                    continue
+                candidates.append(
+                    (marzban_user["username"], days_left, marzban_user["expire"])
+                )
+                if len(candidates) >= EXPIRY_LOOKUP_BATCH_SIZE:
+                    matched, already, lost = await notify_expiring_users(candidates)
+                    expiring += matched
+                    skipped += already
+                    failed += lost
+                    candidates = []
+            if candidates:
+                matched, already, lost = await notify_expiring_users(candidates)
+                expiring += matched
+                skipped += already
+                failed += lost
         except Exception as e:
             logger.error(f"Error checking expiring users: {e}")
-        logger.info("Finished checking expiring users, sleeping for 1 hour...")
+        logger.info(
+            f"Finished checking expiring users: {scanned} users scanned, "
+            f"{expiring} expiring ({skipped} already warned, {failed} failed lookups) "
+            f"in {time.monotonic() - started:.1f}s, sleeping for 1 hour..."
+        )
         await asyncio.sleep(3600)
@@ -1,16 +1,42 @@
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
-from config import CHANNEL_ID
+from config import (
+    CHANNEL_ID,
+    MEMBERSHIP_CACHE_SIZE,
+    MEMBERSHIP_CACHE_TTL,
+    MEMBERSHIP_NEGATIVE_TTL,
+)
+from utils.cache import MISSING, TTLCache
 from utils.logger import logger
 
+MEMBER_STATUSES = ["member", "administrator", "creator"]
 
-async def check_channel_membership(bot: Bot, user_id: int) -> bool:
+membership_cache = TTLCache(MEMBERSHIP_CACHE_SIZE, MEMBERSHIP_CACHE_TTL)
+
+
+def cache_membership(user_id: int, is_member: bool):
+    membership_cache.set(
+        user_id,
+        is_member,
+        ttl=MEMBERSHIP_CACHE_TTL if is_member else MEMBERSHIP_NEGATIVE_TTL,
+    )
+
+
+async def check_channel_membership(
+    bot: Bot, user_id: int, use_cache: bool = True
+) -> bool:
+    if use_cache:
+        cached = membership_cache.get(user_id)
+        if cached is not MISSING:
+            return cached
     try:
         if CHANNEL_ID is not None:
             member = await bot.get_chat_member(CHANNEL_ID, user_id)
-            return member.status in ["member", "administrator", "creator"]
+            is_member = member.status in MEMBER_STATUSES
         else:
-            return False
+            is_member = False
     except TelegramBadRequest as e:
         logger.error(f"Error checking channel membership for user {user_id}: {str(e)}")
-        return False
+        is_member = False
+    cache_membership(user_id, is_member)
+    return is_member
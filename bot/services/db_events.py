@@ -0,0 +1,165 @@
+import asyncio
+import json
+from typing import List, Optional, Set
+
+import asyncpg
+from config import DB_EVENTS_CHANNEL
+from services.order_expiry import order_expiry
+from services.order_service import get_orders_by_status
+from services.provisioning import (
+    notify_rejected,
+    processed_orders,
+    provisioning_queue,
+)
+from services.user_service import user_cache
+from utils.cache import MISSING
+from utils.db import connect
+from utils.logger import logger
+
+# سلامت اتصال LISTEN هر چند ثانیه با یک کوئری ساده چک می‌شه
+KEEPALIVE_INTERVAL = 30
+RECONNECT_DELAY = 5
+# سفارش‌های verified که در این فاصله می‌رسن با هم یک دسته می‌شن
+VERIFIED_BATCH_WINDOW = 0.5
+
+
+class DatabaseEventListener:
+    def __init__(self):
+        self._events: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._notifications: Set[asyncio.Task] = set()
+        self._verified: List[str] = []
+        self.background = False
+        self.connected = False
+        self.received = 0
+        self.invalid = 0
+        self.reconnects = 0
+
+    def start(self, background: bool):
+        # همه‌ی replica ها گوش می‌دن تا کششون باطل بشه؛ کارهای سفارش (لغو،
+        # ساخت اکانت، پیام رد) فقط روی replica ای که background tasks داره
+        self.background = background
+        self._events = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._consume()),
+        ]
+        logger.info(f"Listening for database events on {DB_EVENTS_CHANNEL}")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self.received += 1
+        try:
+            self._events.put_nowait(json.loads(payload))
+        except ValueError:
+            self.invalid += 1
+            logger.error(f"Invalid database event payload: {payload}")
+
+    async def _listen(self):
+        while True:
+            conn: Optional[asyncpg.Connection] = None
+            try:
+                conn = await connect()
+                await conn.add_listener(DB_EVENTS_CHANNEL, self._on_notify)
+                self.connected = True
+                # رویدادهایی که موقع قطعی از دست رفتن با یک بار خوندن جبران می‌شن
+                await self._catch_up()
+                while True:
+                    await asyncio.sleep(KEEPALIVE_INTERVAL)
+                    await asyncio.wait_for(
+                        conn.execute("SELECT 1"), KEEPALIVE_INTERVAL
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Database event listener disconnected: {e}")
+            finally:
+                self.connected = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close(timeout=5)
+            self.reconnects += 1
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _catch_up(self):
+        if not self.background:
+            return
+        try:
+            orders = await get_orders_by_status("verified", fields=["order_id"])
+        except Exception as e:
+            logger.error(f"Failed to catch up on verified orders: {e}")
+            return
+        if orders:
+            provisioning_queue.submit_batch(
+                [order["order_id"] for order in orders], "confirm"
+            )
+
+    async def _consume(self):
+        while True:
+            self._handle(await self._events.get())
+            if self._verified and self._events.empty():
+                await asyncio.sleep(VERIFIED_BATCH_WINDOW)
+                while not self._events.empty():
+                    self._handle(self._events.get_nowait())
+                provisioning_queue.submit_batch(self._verified, "confirm")
+                self._verified = []
+
+    def _handle(self, event: dict):
+        try:
+            if event.get("type") == "user":
+                self._handle_user(event)
+            elif event.get("type") == "order":
+                self._handle_order(event)
+        except Exception as e:
+            logger.error(f"Failed to handle database event {event}: {e}")
+
+    def _handle_user(self, event: dict):
+        telegram_id = event["telegram_id"]
+        # ذخیره‌ی خود ربات کش رو write-through کرده و همون داده الان در کش هست
+        if user_cache.peek(telegram_id) == event.get("user", MISSING):
+            return
+        user_cache.pop(telegram_id)
+
+    def _handle_order(self, event: dict):
+        order_id, status = event["order_id"], event["status"]
+        if status in ("confirmed", "rejected"):
+            processed_orders.set(order_id, status)
+        if not self.background:
+            return
+        logger.info(
+            f"Order {order_id} is now {status} (source: {event.get('source')})"
+        )
+        if status == "pending" and not event.get("receipt_url"):
+            if event.get("created_at"):
+                order_expiry.schedule_order(event)
+            return
+        order_expiry.cancel(order_id)
+        # فقط تغییرهای پنل ادمین پیگیری می‌شن؛ بقیه رو خود ربات انجام داده
+        if event.get("source") != "admin":
+            return
+        if status == "verified":
+            self._verified.append(order_id)
+        elif status == "rejected":
+            task = asyncio.create_task(
+                notify_rejected(
+                    event["telegram_id"], order_id, event.get("is_renewal", False)
+                )
+            )
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "received": self.received,
+            "invalid": self.invalid,
+            "reconnects": self.reconnects,
+            "backlog": self._events.qsize() if self._events else 0,
+        }
+
+
+db_events = DatabaseEventListener()
@@ -0,0 +1,47 @@
+from typing import List, Optional
+
+import asyncpg
+from utils.db import get_pool
+
+# خروجی‌ها هم‌شکل خروجی serializerهای Django هستن
+USER_COLUMNS = (
+    "telegram_id, username, data_limit, expire, status, "
+    "data_limit_reset_strategy, subscription_url"
+)
+ORDER_COLUMNS = (
+    "id, telegram_id, order_id, plan_id, status, created_at, price, "
+    "is_renewal, receipt_url, receipt_message_id, tg_username, tg_fullname"
+)
+
+SELECT_USER_SQL = (
+    f"SELECT {USER_COLUMNS} FROM core_user WHERE telegram_id = $1 ORDER BY id LIMIT 1"
+)
+SELECT_ORDERS_SQL = (
+    f"SELECT {ORDER_COLUMNS} FROM core_order WHERE telegram_id = $1 ORDER BY id"
+)
+SELECT_ORDERS_BY_STATUS_SQL = (
+    f"SELECT {ORDER_COLUMNS} FROM core_order "
+    "WHERE telegram_id = $1 AND status = $2 ORDER BY id"
+)
+
+
+def order_to_dict(row: asyncpg.Record) -> dict:
+    order = dict(row)
+    order["order_id"] = str(order["order_id"])
+    order["created_at"] = order["created_at"].isoformat().replace("+00:00", "Z")
+    return order
+
+
+async def fetch_user_by_telegram_id(telegram_id: int) -> Optional[dict]:
+    pool = await get_pool()
+    row = await pool.fetchrow(SELECT_USER_SQL, telegram_id)
+    return dict(row) if row else None
+
+
+async def fetch_orders(telegram_id: int, status: Optional[str] = None) -> List[dict]:
+    pool = await get_pool()
+    if status is None:
+        rows = await pool.fetch(SELECT_ORDERS_SQL, telegram_id)
+    else:
+        rows = await pool.fetch(SELECT_ORDERS_BY_STATUS_SQL, telegram_id, status)
+    return [order_to_dict(row) for row in rows]
@@ -0,0 +1,28 @@
+from config import DJANGO_API_URL
+from services.api_client import APIClient
+from utils.logger import logger
+
+
+async def get_sent_expiry_notifications(usernames: list) -> set:
+    if not usernames:
+        return set()
+    notifications = await APIClient.post(
+        "/notifications/expiry/lookup/",
+        {"usernames": usernames},
+        base_url=DJANGO_API_URL,
+    )
+    return {
+        (n["username"], n["threshold"], n["expire"]) for n in notifications
+    }
+
+
+async def record_expiry_notifications(entries: list):
+    if not entries:
+        return
+    try:
+        await APIClient.post(
+            "/notifications/expiry/", entries, base_url=DJANGO_API_URL
+        )
+        logger.info(f"Recorded {len(entries)} expiry notifications")
+    except Exception as e:
+        logger.error(f"Failed to record expiry notifications: {e}")
@@ -0,0 +1,74 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from config import ORDER_EXPIRY_MINUTES
+from utils.logger import logger
+
+# چند ثانیه بعد از موعد لغو می‌کنیم تا اختلاف ساعت با دیتابیس مشکلی نسازه
+EXPIRY_GRACE_SECONDS = 2
+
+
+def order_deadline(order: dict) -> float:
+    created_at = datetime.fromisoformat(order["created_at"].replace("Z", "+00:00"))
+    return created_at.timestamp() + ORDER_EXPIRY_MINUTES * 60 + EXPIRY_GRACE_SECONDS
+
+
+class OrderExpiryScheduler:
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, order_id: str, deadline: float):
+        self._deadlines[order_id] = deadline
+        heapq.heappush(self._heap, (deadline, order_id))
+        if self._heap[0] == (deadline, order_id):
+            self._wakeup.set()
+        logger.debug(f"Order {order_id} scheduled to expire at {deadline:.0f}")
+
+    def schedule_order(self, order: dict):
+        if order.get("receipt_url"):
+            return
+        self.schedule(str(order["order_id"]), order_deadline(order))
+
+    def cancel(self, order_id: str):
+        # ورودی heap همونجا می‌مونه و موقع pop نادیده گرفته می‌شه
+        if self._deadlines.pop(order_id, None) is not None:
+            logger.debug(f"Expiry timer for order {order_id} cancelled")
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._heap = [(d, o) for o, d in self._deadlines.items()]
+                heapq.heapify(self._heap)
+
+    def _drop_cancelled(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now: float) -> List[str]:
+        due = []
+        self._drop_cancelled()
+        while self._heap and self._heap[0][0] <= now:
+            _, order_id = heapq.heappop(self._heap)
+            del self._deadlines[order_id]
+            due.append(order_id)
+            self._drop_cancelled()
+        return due
+
+    async def wait_next(self):
+        self._drop_cancelled()
+        timeout = self._heap[0][0] - time.time() if self._heap else None
+        if timeout is not None and timeout <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+order_expiry = OrderExpiryScheduler()
@@ -1,5 +1,10 @@
-from config import DJANGO_API_URL
+from typing import AsyncIterator, List, Optional
+
+from config import DIRECT_DB_READS, DJANGO_API_URL
 from services.api_client import APIClient
+from services.db_reader import fetch_orders
+from services.order_expiry import order_expiry
+from services.user_service import cache_user
 from utils.logger import logger
 
 
@@ -28,6 +33,7 @@ async def save_order(
     try:
         response = await APIClient.post("/orders/", data, base_url=DJANGO_API_URL)
         logger.info(f"Order saved successfully: {order_id}, response: {response}")
+        order_expiry.schedule_order(response)
         return response
     except Exception as e:
         logger.error(f"Failed to save order: {e}")
@@ -40,13 +46,55 @@ async def update_order(order_id: str, data: dict):
             f"/orders/{order_id}/", data, base_url=DJANGO_API_URL
         )
         logger.info(f"Order {order_id} updated: {response}")
+        if data.get("receipt_url") or data.get("status", "pending") != "pending":
+            order_expiry.cancel(order_id)
         return response
     except Exception as e:
         logger.error(f"Failed to update order {order_id}: {e}")
         raise
 
 
+async def confirm_order(order_id: str, user_record: dict) -> dict:
+    # تأیید سفارش و upsert کاربر در یک تراکنش سمت Django
+    try:
+        response = await APIClient.post(
+            f"/orders/{order_id}/confirm/",
+            {"user": user_record},
+            base_url=DJANGO_API_URL,
+        )
+        logger.info(f"Order {order_id} confirmed: {response}")
+        order_expiry.cancel(order_id)
+        if response.get("user"):
+            cache_user(user_record["telegram_id"], response["user"])
+        return response
+    except Exception as e:
+        logger.error(f"Failed to confirm order {order_id}: {e}")
+        raise
+
+
+async def expire_pending_orders(older_than_minutes: int, order_ids: list = None):
+    data = {"older_than_minutes": older_than_minutes}
+    if order_ids is not None:
+        data["order_ids"] = order_ids
+    try:
+        expired = await APIClient.post(
+            "/orders/expire/", data, base_url=DJANGO_API_URL
+        )
+        logger.info(f"Expired {len(expired)} pending orders")
+        return expired
+    except Exception as e:
+        logger.error(f"Failed to expire pending orders: {e}")
+        raise
+
+
 async def get_orders(telegram_id: int):
+    if DIRECT_DB_READS:
+        try:
+            return await fetch_orders(telegram_id)
+        except Exception as e:
+            logger.warning(
+                f"Direct DB read failed for orders of telegram_id={telegram_id}, using API: {e}"
+            )
     try:
         orders = await APIClient.get(
             "/orders/", params={"telegram_id": telegram_id}, base_url=DJANGO_API_URL
@@ -58,7 +106,36 @@ async def get_orders(telegram_id: int):
         return []
 
 
+async def iter_orders_by_status(
+    status: str, fields: Optional[List[str]] = None
+) -> AsyncIterator[dict]:
+    params = {"status": status}
+    if fields:
+        params["fields"] = ",".join(fields)
+    async for order in APIClient.iter_pages(
+        "/orders/", params=params, base_url=DJANGO_API_URL
+    ):
+        yield order
+
+
+async def get_orders_by_status(status: str, fields: Optional[List[str]] = None):
+    try:
+        orders = [order async for order in iter_orders_by_status(status, fields)]
+        logger.info(f"Fetched {len(orders)} {status} orders")
+        return orders
+    except Exception as e:
+        logger.error(f"Failed to fetch {status} orders: {e}")
+        raise
+
+
 async def get_pending_orders(telegram_id: int):
+    if DIRECT_DB_READS:
+        try:
+            return await fetch_orders(telegram_id, status="pending")
+        except Exception as e:
+            logger.warning(
+                f"Direct DB read failed for pending orders of telegram_id={telegram_id}, using API: {e}"
+            )
     try:
         orders = await APIClient.get(
             "/orders/",
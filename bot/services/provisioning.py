@@ -0,0 +1,471 @@
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from config import (
+    ADMIN_TELEGRAM_ID,
+    BATCH_CONCURRENCY,
+    PROVISION_QUEUE_SIZE,
+    PROVISION_WORKERS,
+)
+from keyboards.main_menu import get_admin_menu, get_main_menu
+from services.order_service import confirm_order, get_order, update_order
+from services.send_queue import PRIORITY_ADMIN, send_queue
+from services.user_service import (
+    build_user_record,
+    create_user,
+    get_user_by_telegram_id,
+    is_admin,
+    renew_user,
+)
+from utils.cache import TTLCache
+from utils.locks import KeyedLock
+from utils.logger import logger
+from utils.plans import get_plan_by_id
+
+# نتیجه‌ی سفارش‌های پردازش‌شده برای جواب فوری به کلیک‌های تکراری
+PROCESSED_ORDER_TTL = 3600
+# موقع خاموش شدن این‌قدر صبر می‌کنیم تا کارهای در جریان تموم بشن
+DRAIN_TIMEOUT = 30
+# بیشتر از این تعداد خطا توی خلاصه‌ی عملیات گروهی نشون داده نمی‌شه
+BATCH_SUMMARY_ERRORS = 20
+
+# فقط سفارش‌هایی با این وضعیت‌ها اکانت می‌گیرن؛ رد/منقضی‌شده‌ها نه
+PROVISIONABLE_STATUSES = ("pending", "verified")
+# اگه اکانت در Marzban ساخته/تمدید شد ولی تأیید Django شکست خورد، نتیجه اینجا
+# می‌مونه تا تلاش بعدی فقط تأیید Django رو دوباره بفرسته
+PROVISIONED_ORDER_TTL = 86400
+
+order_locks = KeyedLock()
+user_locks = KeyedLock()
+processed_orders = TTLCache(1000, PROCESSED_ORDER_TTL)
+provisioned_orders = TTLCache(1000, PROVISIONED_ORDER_TTL)
+
+
+class ProvisioningError(Exception):
+    pass
+
+
+async def provision_account(
+    order_id: str,
+    telegram_id: int,
+    plan: dict,
+    tg_username: Optional[str],
+    tg_userfn: Optional[str],
+) -> Tuple[str, dict, bool]:
+    data_limit = int(plan["data_limit"])
+    expire_days = int(plan["expire_days"])
+    users = plan["users"]
+    provisioned = provisioned_orders.get(order_id, None)
+    if provisioned is not None:
+        logger.info(
+            f"Order {order_id} was already provisioned in Marzban, retrying confirm"
+        )
+        username, user_info, renewed = provisioned
+    else:
+        existing_user = await get_user_by_telegram_id(telegram_id)
+        renewed = bool(existing_user)
+        if existing_user:
+            username = str(existing_user.get("username"))
+            user_info = await renew_user(
+                telegram_id, username, data_limit, expire_days, users, sync=False
+            )
+        else:
+            username = (
+                f"{tg_userfn}: @{tg_username}"
+                if tg_username and tg_userfn
+                else f"user_{uuid.uuid4().hex[:8]}"
+            )
+            user_info = await create_user(
+                telegram_id, username, data_limit, expire_days, users, sync=False
+            )
+        if not user_info:
+            logger.error(
+                f"Failed to {'renew' if renewed else 'create'} user for order {order_id}: {user_info}"
+            )
+            raise ProvisioningError(
+                f"خطا در {'تمدید' if renewed else 'ایجاد'} اکانت: {user_info}"
+            )
+        provisioned_orders.set(order_id, (username, user_info, renewed))
+
+    await confirm_order(
+        order_id,
+        build_user_record(
+            telegram_id,
+            username,
+            data_limit,
+            user_info.get("expire") or 0,
+            user_info.get("subscription_url", ""),
+        ),
+    )
+    processed_orders.set(order_id, "confirmed")
+    provisioned_orders.pop(order_id)
+    return username, user_info, renewed
+
+
+async def provision_order(
+    order_id: str, tg_username: str = "", tg_userfn: str = ""
+) -> str:
+    # دو بار زدن دکمه یا callback تکراری نباید اکانت رو دو بار بسازه/تمدید کنه
+    async with order_locks(order_id):
+        if processed_orders.get(order_id) == "confirmed":
+            return "already_confirmed"
+        try:
+            order = await get_order(order_id)
+        except Exception as e:
+            logger.error(f"Failed to fetch order {order_id}: {e}")
+            raise ProvisioningError("سفارش یافت نشد!") from e
+        telegram_id = order.get("telegram_id")
+        if not telegram_id or not isinstance(telegram_id, int):
+            logger.error(f"Invalid or missing telegram_id for order {order_id}")
+            raise ProvisioningError("telegram_id نامعتبر است!")
+        plan_id, is_renewal = order["plan_id"], order.get("is_renewal", False)
+        plan = get_plan_by_id(plan_id)
+        if not plan:
+            logger.error(f"Invalid plan: {plan_id}")
+            raise ProvisioningError("پلن نامعتبره!")
+        order_status = order.get("status")
+        if order_status == "confirmed":
+            logger.info(f"Order {order_id} is already confirmed, skipping")
+            processed_orders.set(order_id, "confirmed")
+            return "already_confirmed"
+        if order_status not in PROVISIONABLE_STATUSES:
+            logger.warning(f"Order {order_id} is {order_status}, not provisioning")
+            if order_status == "rejected":
+                processed_orders.set(order_id, "rejected")
+            raise ProvisioningError(
+                f"وضعیت سفارش {order_status} است و قابل تأیید نیست!"
+            )
+
+        # سفارش‌های یک کاربر پشت سر هم اجرا می‌شن تا دو سفارش هم‌زمان یک کاربر
+        # جدید دو اکانت نسازن؛ دومی بعد از تأیید اولی کاربر رو موجود می‌بینه
+        async with user_locks(telegram_id):
+            username, user_info, renewed = await provision_account(
+                order_id,
+                telegram_id,
+                plan,
+                tg_username or order.get("tg_username"),
+                tg_userfn or order.get("tg_fullname"),
+            )
+
+    data_limit = int(plan["data_limit"])
+    expire_days = int(plan["expire_days"])
+    message_text = (
+        f"✅ **{'تمدید اکانت شما' if renewed or is_renewal else 'سفارش شما'} تأیید شد!** 🎉\n"
+        f"👤 **نام کاربری**: {username}\n"
+        f"📈 **حجم**: {data_limit / 1073741824 if data_limit else '♾️ نامحدود'} گیگابایت\n"
+        f"⏳ **مدت**: {expire_days if expire_days else 'لایف‌تایم'} روز\n"
+        f"🔗 **لینک اشتراک**: {user_info['subscription_url']}\n"
+        f"لطفاً این لینک رو ذخیره کن یا از /getlink برای دریافت مجدد استفاده کن."
+    )
+    try:
+        await send_queue.send_message(
+            telegram_id,
+            message_text,
+            parse_mode="markdown",
+            reply_markup=get_admin_menu()
+            if await is_admin(telegram_id)
+            else get_main_menu(),
+        )
+    except Exception as e:
+        logger.error(f"Failed to notify user {telegram_id} for order {order_id}: {e}")
+    return "confirmed"
+
+
+async def reject_pending_order(order_id: str) -> str:
+    async with order_locks(order_id):
+        try:
+            order = await get_order(order_id)
+        except Exception as e:
+            logger.error(f"Failed to fetch order {order_id}: {e}")
+            raise ProvisioningError("سفارش یافت نشد!") from e
+        telegram_id = order.get("telegram_id")
+        if not telegram_id or not isinstance(telegram_id, int):
+            logger.error(f"Invalid or missing telegram_id for order {order_id}")
+            raise ProvisioningError("telegram_id نامعتبر است!")
+        status = order.get("status")
+        if status in ("confirmed", "rejected"):
+            logger.info(f"Order {order_id} is already {status}, skipping reject")
+            processed_orders.set(order_id, status)
+            return f"already_{status}"
+        if order_id in provisioned_orders:
+            logger.warning(f"Order {order_id} is provisioned in Marzban, not rejecting")
+            raise ProvisioningError(
+                "اکانت این سفارش ساخته شده، فقط تأیید مجدد ممکن است!"
+            )
+        await update_order(order_id, {"status": "rejected", "telegram_id": telegram_id})
+        processed_orders.set(order_id, "rejected")
+
+    await notify_rejected(telegram_id, order_id, order.get("is_renewal", False))
+    return "rejected"
+
+
+async def notify_rejected(telegram_id: int, order_id: str, is_renewal: bool = False):
+    try:
+        await send_queue.send_message(
+            telegram_id,
+            f"{'تمدید' if is_renewal else 'سفارش'} *{order_id}* توسط ادمین رد شد. 😔",
+            parse_mode="markdown",
+        )
+    except Exception as e:
+        logger.error(f"Failed to notify user {telegram_id} for order {order_id}: {e}")
+
+
+BATCH_ACTIONS = {"confirm": provision_order, "reject": reject_pending_order}
+
+
+class BatchResult:
+    def __init__(self, action: str):
+        self.action = action
+        self.done: List[str] = []
+        self.skipped: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.elapsed = 0.0
+
+    def __len__(self):
+        return len(self.done) + len(self.skipped) + len(self.failed)
+
+    def summary(self) -> str:
+        title = "تأیید" if self.action == "confirm" else "رد"
+        lines = [
+            f"📦 *نتیجه‌ی {title} گروهی*: {len(self)} سفارش در {self.elapsed:.1f} ثانیه",
+            f"✅ انجام شد: {len(self.done)}",
+            f"ℹ️ قبلاً پردازش شده: {len(self.skipped)}",
+            f"❌ ناموفق: {len(self.failed)}",
+        ]
+        for order_id, error in list(self.failed.items())[:BATCH_SUMMARY_ERRORS]:
+            lines.append(f"• `{order_id}`: `{error}`")
+        if len(self.failed) > BATCH_SUMMARY_ERRORS:
+            lines.append(f"• و {len(self.failed) - BATCH_SUMMARY_ERRORS} خطای دیگر...")
+        return "\n".join(lines)
+
+
+async def process_orders(
+    order_ids: List[str], action: str, concurrency: int = BATCH_CONCURRENCY
+) -> BatchResult:
+    # سفارش‌ها هم‌زمان پردازش می‌شن ولی حداکثر concurrency تا در یک لحظه
+    handler = BATCH_ACTIONS[action]
+    semaphore = asyncio.Semaphore(concurrency)
+    result = BatchResult(action)
+    started = time.monotonic()
+
+    async def run(order_id: str):
+        async with semaphore:
+            try:
+                outcome = await handler(order_id)
+            except ProvisioningError as e:
+                result.failed[order_id] = str(e)
+                return
+            except Exception as e:
+                logger.error(f"Failed to {action} order {order_id}: {e}")
+                result.failed[order_id] = str(e)
+                return
+            if outcome.startswith("already_"):
+                result.skipped.append(order_id)
+            else:
+                result.done.append(order_id)
+
+    await asyncio.gather(*(run(order_id) for order_id in dict.fromkeys(order_ids)))
+    result.elapsed = time.monotonic() - started
+    logger.info(
+        f"Batch {action} of {len(result)} orders finished in {result.elapsed:.2f}s: "
+        f"{len(result.done)} done, {len(result.skipped)} skipped, {len(result.failed)} failed"
+    )
+    return result
+
+
+class ProvisionJob:
+    __slots__ = (
+        "order_id",
+        "tg_username",
+        "tg_userfn",
+        "chat_id",
+        "message_id",
+        "caption",
+        "enqueued_at",
+    )
+
+    def __init__(
+        self,
+        order_id: str,
+        tg_username: str,
+        tg_userfn: str,
+        chat_id: int = ADMIN_TELEGRAM_ID,
+        message_id: Optional[int] = None,
+        caption: Optional[str] = None,
+    ):
+        self.order_id = order_id
+        self.tg_username = tg_username
+        self.tg_userfn = tg_userfn
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.caption = caption
+        self.enqueued_at = time.monotonic()
+
+
+class ProvisioningQueue:
+    def __init__(self, max_size: int = PROVISION_QUEUE_SIZE):
+        self._queue: Optional[asyncio.Queue] = None
+        self._max_size = max_size
+        self._queued: Set[str] = set()
+        self._bot: Optional[Bot] = None
+        self._workers: List[asyncio.Task] = []
+        self._batches: Set[asyncio.Task] = set()
+        self.in_progress = 0
+        self.confirmed = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.batches = 0
+        self.batch_orders = 0
+
+    def start(self, bot: Bot, workers: int = PROVISION_WORKERS):
+        self._bot = bot
+        self._queue = asyncio.Queue(maxsize=self._max_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        logger.info(f"Provisioning queue started with {workers} workers")
+
+    async def close(self):
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Provisioning queue closed with {self._queue.qsize()} jobs left"
+                )
+        if self._batches:
+            _, pending = await asyncio.wait(self._batches, timeout=DRAIN_TIMEOUT)
+            if pending:
+                logger.warning(
+                    f"Provisioning queue closed with {len(pending)} batches left"
+                )
+        for task in [*self._workers, *self._batches]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._batches, return_exceptions=True)
+        self._workers = []
+
+    def is_queued(self, order_id: str) -> bool:
+        return order_id in self._queued
+
+    def submit(self, job: ProvisionJob):
+        if self._queue is None:
+            raise RuntimeError("Provisioning queue is not started")
+        # اگه صف پر باشه asyncio.QueueFull بالا می‌ره
+        self._queue.put_nowait(job)
+        self._queued.add(job.order_id)
+        logger.info(f"Order {job.order_id} queued for provisioning")
+
+    def submit_batch(
+        self,
+        order_ids: List[str],
+        action: str,
+        chat_id: int = ADMIN_TELEGRAM_ID,
+        message_id: Optional[int] = None,
+    ):
+        # عملیات گروهی جدا از صف اجرا می‌شه تا هندلر و چت ادمین منتظر نمونن
+        task = asyncio.create_task(
+            self._run_batch(order_ids, action, chat_id, message_id)
+        )
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+        logger.info(f"Batch {action} of {len(order_ids)} orders submitted")
+
+    async def _run_batch(
+        self,
+        order_ids: List[str],
+        action: str,
+        chat_id: int,
+        message_id: Optional[int],
+    ):
+        result = await process_orders(order_ids, action)
+        self.batches += 1
+        self.batch_orders += len(result)
+        try:
+            if message_id is not None:
+                await self._bot.edit_message_text(
+                    text=result.summary(),
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    parse_mode="Markdown",
+                )
+            else:
+                await send_queue.send_message(
+                    chat_id,
+                    result.summary(),
+                    priority=PRIORITY_ADMIN,
+                    parse_mode="Markdown",
+                )
+        except Exception as e:
+            logger.error(f"Failed to report batch {action} to admin: {e}")
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self.in_progress += 1
+            try:
+                await self._process(job)
+            finally:
+                self.in_progress -= 1
+                self._queued.discard(job.order_id)
+                self._queue.task_done()
+
+    async def _process(self, job: ProvisionJob):
+        try:
+            result = await provision_order(
+                job.order_id, job.tg_username, job.tg_userfn
+            )
+            status_line = (
+                "✅ **وضعیت**: تأیید شده"
+                if result == "confirmed"
+                else "ℹ️ **وضعیت**: قبلاً تأیید شده بود"
+            )
+            self.confirmed += 1
+        except ProvisioningError as e:
+            status_line = f"❌ **خطا در تأیید سفارش**: `{e}`"
+            self.failed += 1
+        except Exception as e:
+            logger.error(f"Failed to confirm order {job.order_id}: {e}")
+            status_line = f"❌ **خطا در تأیید سفارش**: `{str(e)}`"
+            self.failed += 1
+        latency = time.monotonic() - job.enqueued_at
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        logger.info(f"Provisioning of order {job.order_id} finished in {latency:.2f}s")
+        try:
+            if job.message_id is not None and job.caption:
+                await self._bot.edit_message_caption(
+                    chat_id=job.chat_id,
+                    message_id=job.message_id,
+                    caption=f"{job.caption}\n\n{status_line}",
+                    parse_mode="Markdown",
+                )
+            else:
+                await send_queue.send_message(
+                    job.chat_id,
+                    f"سفارش {job.order_id}\n{status_line}",
+                    priority=PRIORITY_ADMIN,
+                    parse_mode="Markdown",
+                )
+        except Exception as e:
+            logger.error(f"Failed to report order {job.order_id} to admin: {e}")
+
+    def stats(self) -> dict:
+        finished = self.confirmed + self.failed
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "in_progress": self.in_progress,
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+            "avg_latency_ms": round(self.total_latency / finished * 1000, 1)
+            if finished
+            else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+            "batches_running": len(self._batches),
+            "batches": self.batches,
+            "batch_orders": self.batch_orders,
+        }
+
+
+provisioning_queue = ProvisioningQueue()
@@ -0,0 +1,219 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from config import (
+    SEND_MAX_RETRIES,
+    SEND_QUEUE_SIZE,
+    SEND_QUEUE_WORKERS,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_GLOBAL_RATE,
+)
+from utils.logger import logger
+
+PRIORITY_ADMIN = 0
+PRIORITY_USER = 1
+PRIORITY_BULK = 2
+
+# حداکثر تعداد چت‌هایی که bucket اونها رو نگه می‌داریم
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class SendJob:
+    __slots__ = (
+        "method",
+        "chat_id",
+        "kwargs",
+        "bulk",
+        "future",
+        "enqueued_at",
+        "attempts",
+    )
+
+    def __init__(self, method: str, chat_id: int, kwargs: dict, bulk: bool = False):
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.bulk = bulk
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class SendQueue:
+    def __init__(
+        self,
+        max_size: int = SEND_QUEUE_SIZE,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+    ):
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._bulk_slots: Optional[asyncio.Semaphore] = None
+        self._max_size = max_size
+        self._seq = itertools.count()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chats: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._paused_until = 0.0
+        self._bot: Optional[Bot] = None
+        self._workers: List[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.bulk_waiting = 0
+
+    def start(self, bot: Bot, workers: int = SEND_QUEUE_WORKERS):
+        self._bot = bot
+        # صف خودش نامحدوده و فقط پیام‌های گروهی سقف دارن؛ اگه put روی صف پر
+        # منتظر بمونه، پیام ادمین پشت همه‌ی پیام‌های گروهی منتظر گیر می‌کنه
+        self._queue = asyncio.PriorityQueue()
+        self._bulk_slots = asyncio.Semaphore(self._max_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+        logger.info(f"Send queue started with {workers} workers")
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(
+        self, method: str, chat_id: int, priority: int = PRIORITY_USER, **kwargs
+    ):
+        if self._queue is None:
+            raise RuntimeError("Send queue is not started")
+        job = SendJob(method, chat_id, kwargs, bulk=priority >= PRIORITY_BULK)
+        if job.bulk:
+            self.bulk_waiting += 1
+            try:
+                await self._bulk_slots.acquire()
+            finally:
+                self.bulk_waiting -= 1
+        self._queue.put_nowait((priority, next(self._seq), job))
+        return await job.future
+
+    async def send_message(
+        self, chat_id: int, text: str, priority: int = PRIORITY_USER, **kwargs
+    ):
+        return await self.submit("send_message", chat_id, priority, text=text, **kwargs)
+
+    async def send_photo(
+        self, chat_id: int, photo: str, priority: int = PRIORITY_USER, **kwargs
+    ):
+        return await self.submit("send_photo", chat_id, priority, photo=photo, **kwargs)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self._chat_rate, 1)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > MAX_CHAT_BUCKETS:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _acquire(self, chat_id: int):
+        while True:
+            now = time.monotonic()
+            delay = max(
+                self._paused_until - now,
+                self._global.delay(),
+                self._chat_bucket(chat_id).delay(),
+            )
+            if delay <= 0:
+                self._global.consume()
+                self._chat_bucket(chat_id).consume()
+                return
+            await asyncio.sleep(delay)
+
+    async def _worker(self):
+        while True:
+            priority, seq, job = await self._queue.get()
+            try:
+                await self._process(job)
+            finally:
+                if job.bulk:
+                    self._bulk_slots.release()
+                self._queue.task_done()
+
+    async def _process(self, job: SendJob):
+        while True:
+            await self._acquire(job.chat_id)
+            job.attempts += 1
+            try:
+                result = await getattr(self._bot, job.method)(job.chat_id, **job.kwargs)
+            except TelegramRetryAfter as e:
+                # محدودیت تلگرام؛ همه‌ی workerها تا retry_after صبر می‌کنن
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + e.retry_after
+                )
+                if job.attempts <= SEND_MAX_RETRIES:
+                    self.retried += 1
+                    logger.warning(
+                        f"Telegram flood limit for chat {job.chat_id}, retrying in {e.retry_after}s"
+                    )
+                    continue
+                self._finish(job, error=e)
+                return
+            except Exception as e:
+                self._finish(job, error=e)
+                return
+            self._finish(job, result=result)
+            return
+
+    def _finish(self, job: SendJob, result=None, error: Exception = None):
+        latency = time.monotonic() - job.enqueued_at
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if error is not None:
+            self.failed += 1
+            logger.error(f"Failed to {job.method} to chat {job.chat_id}: {error}")
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def stats(self) -> dict:
+        finished = self.sent + self.failed
+        return {
+            "depth": self._queue.qsize() if self._queue else 0,
+            "bulk_waiting": self.bulk_waiting,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "avg_latency_ms": round(self.total_latency / finished * 1000, 1)
+            if finished
+            else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+        }
+
+
+send_queue = SendQueue()
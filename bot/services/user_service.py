@@ -1,10 +1,35 @@
 from datetime import datetime, timedelta
 from typing import Optional
 
-from config import API_BASE_URL, DJANGO_API_URL
+from config import (
+    ADMIN_TELEGRAM_ID,
+    API_BASE_URL,
+    DIRECT_DB_READS,
+    DJANGO_API_URL,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+    USER_NEGATIVE_TTL,
+)
 from services.api_client import APIClient
+from services.db_reader import fetch_user_by_telegram_id
+from utils.cache import MISSING, TTLCache
 from utils.logger import logger
-from utils.marzban import get_jwt_token
+from utils.marzban import marzban_request
+
+# کاربرهایی که اکانت ندارن هم با None و TTL کوتاه‌تر کش می‌شن
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+def cache_user(telegram_id: int, user: Optional[dict]):
+    user_cache.set(
+        telegram_id,
+        user,
+        ttl=USER_CACHE_TTL if user else USER_NEGATIVE_TTL,
+    )
+
+
+async def is_admin(user_id: int) -> bool:
+    return user_id == ADMIN_TELEGRAM_ID
 
 
 async def get_subscription_info(token: str) -> Optional[dict]:
@@ -16,28 +41,55 @@ async def get_subscription_info(token: str) -> Optional[dict]:
         return None
 
 
-async def get_user_by_telegram_id(telegram_id: Optional[int]) -> Optional[dict]:
+async def get_user_by_telegram_id(
+    telegram_id: Optional[int], use_cache: bool = True
+) -> Optional[dict]:
     if telegram_id is None:
         logger.error("telegram_id is None")
         return None
     else:
-        try:
-            users = await APIClient.get(
-                "/users/",
-                params={"telegram_id": telegram_id},
-                base_url=DJANGO_API_URL,
-            )
-            if users and isinstance(users, list) and len(users) > 0:
-                user = users[0]
-                return user
-            else:
-                logger.warning(f"No user found for telegram_id={telegram_id}")
+        if use_cache:
+            cached = user_cache.get(telegram_id)
+            if cached is not MISSING:
+                return cached
+        user = MISSING
+        if DIRECT_DB_READS:
+            try:
+                user = await fetch_user_by_telegram_id(telegram_id)
+            except Exception as e:
+                logger.warning(
+                    f"Direct DB read failed for telegram_id={telegram_id}, using API: {e}"
+                )
+        if user is MISSING:
+            try:
+                users = await APIClient.get(
+                    "/users/",
+                    params={"telegram_id": telegram_id},
+                    base_url=DJANGO_API_URL,
+                )
+            except Exception as e:
+                logger.error(f"Failed to fetch user by telegram_id={telegram_id}: {e}")
                 return None
-        except Exception as e:
-            logger.error(f"Failed to fetch user by telegram_id={telegram_id}: {e}")
+            user = users[0] if users and isinstance(users, list) else None
+        if user:
+            cache_user(telegram_id, user)
+            return user
+        else:
+            logger.warning(f"No user found for telegram_id={telegram_id}")
+            cache_user(telegram_id, None)
             return None
 
 
+async def get_users_by_usernames(usernames: list, fields: list = None) -> list:
+    if not usernames:
+        return []
+    # لیست username ها در body میره چون ممکنه کاما داشته باشن و query string کوتاهه
+    url = f"/users/lookup/?fields={','.join(fields)}" if fields else "/users/lookup/"
+    return await APIClient.post(
+        url, {"usernames": usernames}, base_url=DJANGO_API_URL
+    )
+
+
 async def get_user_data(telegram_id: int) -> tuple:
     try:
         user = await get_user_by_telegram_id(telegram_id)
@@ -49,20 +101,63 @@ async def get_user_data(telegram_id: int) -> tuple:
         return (None, None)
 
 
+def build_user_record(
+    telegram_id: int,
+    username: str,
+    data_limit: int,
+    expire_timestamp: int,
+    subscription_url: str,
+) -> dict:
+    return {
+        "telegram_id": telegram_id,
+        "username": username,
+        "data_limit": data_limit,
+        "expire": expire_timestamp,
+        "status": "active",
+        "data_limit_reset_strategy": "no_reset",
+        "subscription_url": subscription_url,
+    }
+
+
+async def save_user_in_django(
+    telegram_id: int,
+    username: str,
+    data_limit: int,
+    expire_timestamp: int,
+    user_info: dict,
+) -> Optional[dict]:
+    django_payload = build_user_record(
+        telegram_id,
+        username,
+        data_limit,
+        expire_timestamp,
+        user_info.get("subscription_url", ""),
+    )
+    try:
+        # یک درخواست upsert به جای GET و بعد PUT/POST
+        response = await APIClient.post(
+            "/users/upsert/", django_payload, base_url=DJANGO_API_URL
+        )
+        logger.info(f"User {username} saved in Django: {response}")
+        cache_user(telegram_id, response)
+        return response
+    except Exception as e:
+        logger.error(f"Failed to save user {username} in Django: {e}")
+        user_cache.pop(telegram_id)
+        return None
+
+
 async def create_user(
     telegram_id: int,
     username: str,
     data_limit: int,
     expire_days: int,
     users: str,
+    sync: bool = True,
 ):
     logger.debug(
         f"Creating user {username} with data_limit={data_limit}, expire_days={expire_days}, users={users}"
     )
-    headers = {
-        "Authorization": f"Bearer {get_jwt_token()}",
-        "Content-Type": "application/json",
-    }
     expire_timestamp = (
         0
         if expire_days == 0
@@ -81,38 +176,13 @@ async def create_user(
         "data_limit_reset_strategy": "no_reset",
     }
     try:
-        user_info = await APIClient.post(
-            "/api/user", payload, headers=headers, base_url=API_BASE_URL
-        )
+        user_info = await marzban_request("POST", "/api/user", payload)
         logger.info(f"User {username} created successfully: {user_info}")
-        if telegram_id:
-            try:
-                existing_user = await get_user_by_telegram_id(telegram_id)
-                django_payload = {
-                    "telegram_id": telegram_id,
-                    "username": username,
-                    "data_limit": data_limit,
-                    "expire": expire_timestamp,
-                    "status": "active",
-                    "data_limit_reset_strategy": "no_reset",
-                    "subscription_url": user_info.get("subscription_url", ""),
-                }
-                if existing_user:
-                    await APIClient.put(
-                        f"/users/{username}/",
-                        django_payload,
-                        base_url=DJANGO_API_URL,
-                    )
-                    logger.info(
-                        f"User {username} updated in Django with id={existing_user['id']}"
-                    )
-                else:
-                    response = await APIClient.post(
-                        "/users/", django_payload, base_url=DJANGO_API_URL
-                    )
-                    logger.info(f"User {username} saved in Django: {response}")
-            except Exception as e:
-                logger.error(f"Failed to save user {username} in Django: {e}")
+        # با sync=False ذخیره در Django با خود caller هست (مثلاً confirm سفارش)
+        if telegram_id and sync:
+            await save_user_in_django(
+                telegram_id, username, data_limit, expire_timestamp, user_info
+            )
         return user_info
     except Exception as e:
         logger.error(f"Failed to create user {username}: {e}")
@@ -125,14 +195,11 @@ async def renew_user(
     data_limit: int,
     expire_days: int,
     users: str,
+    sync: bool = True,
 ):
     logger.debug(
         f"Renewing user {username} with data_limit={data_limit}, expire_days={expire_days}, users={users}"
     )
-    headers = {
-        "Authorization": f"Bearer {get_jwt_token()}",
-        "Content-Type": "application/json",
-    }
     expire_timestamp = (
         0
         if expire_days == 0
@@ -149,38 +216,13 @@ async def renew_user(
         "data_limit_reset_strategy": "no_reset",
     }
     try:
-        user_info = await APIClient.put(
-            f"/api/user/{username}", payload, headers=headers, base_url=API_BASE_URL
-        )
+        user_info = await marzban_request("PUT", f"/api/user/{username}", payload)
         logger.info(f"User {username} renewed successfully: {user_info}")
-        if telegram_id:
-            try:
-                existing_user = await get_user_by_telegram_id(telegram_id)
-                django_payload = {
-                    "telegram_id": telegram_id,
-                    "username": username,
-                    "data_limit": data_limit,
-                    "expire": expire_timestamp,
-                    "status": "active",
-                    "data_limit_reset_strategy": "no_reset",
-                    "subscription_url": user_info.get("subscription_url", ""),
-                }
-                if existing_user:
-                    await APIClient.put(
-                        f"/users/{username}/",
-                        django_payload,
-                        base_url=DJANGO_API_URL,
-                    )
-                    logger.info(
-                        f"User {username} updated in Django with id={existing_user['id']}"
-                    )
-                else:
-                    response = await APIClient.post(
-                        "/users/", django_payload, base_url=DJANGO_API_URL
-                    )
-                    logger.info(f"User {username} saved in Django: {response}")
-            except Exception as e:
-                logger.error(f"Failed to update user {username} in Django: {e}")
+        # با sync=False ذخیره در Django با خود caller هست (مثلاً confirm سفارش)
+        if telegram_id and sync:
+            await save_user_in_django(
+                telegram_id, username, data_limit, expire_timestamp, user_info
+            )
         return user_info
     except Exception as e:
         logger.error(f"Failed to renew user {username}: {e}")
@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from config import FSM_MEMORY_IDLE_TTL, FSM_MEMORY_MAX_ENTRIES
+
+
+class StateRecord:
+    __slots__ = ("state", "data", "touched_at")
+
+    def __init__(self):
+        self.state: Optional[str] = None
+        self.data: Optional[dict] = None
+        self.touched_at = time.monotonic()
+
+
+class BoundedMemoryStorage(BaseStorage):
+    def __init__(
+        self,
+        max_entries: int = FSM_MEMORY_MAX_ENTRIES,
+        idle_ttl: float = FSM_MEMORY_IDLE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        # ترتیب OrderedDict همون ترتیب آخرین استفاده‌ست؛ قدیمی‌ترها اول
+        self._records: "OrderedDict[StorageKey, StateRecord]" = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+
+    def _expire_idle(self, now: float):
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if now - record.touched_at < self.idle_ttl:
+                break
+            del self._records[key]
+            self.evicted_idle += 1
+
+    def _get(self, key: StorageKey) -> Optional[StateRecord]:
+        now = time.monotonic()
+        self._expire_idle(now)
+        record = self._records.get(key)
+        if record is not None:
+            record.touched_at = now
+            self._records.move_to_end(key)
+        return record
+
+    def _put(self, key: StorageKey) -> StateRecord:
+        record = self._get(key)
+        if record is None:
+            record = StateRecord()
+            self._records[key] = record
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+                self.evicted_lru += 1
+        return record
+
+    def _drop_if_empty(self, key: StorageKey, record: StateRecord):
+        # کلیدی که نه state داره نه data نگه داشته نمی‌شه
+        if record.state is None and not record.data:
+            del self._records[key]
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._put(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._drop_if_empty(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get(key)
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        record = self._put(key)
+        record.data = dict(data) if data else None
+        self._drop_if_empty(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get(key)
+        return dict(record.data) if record is not None and record.data else {}
+
+    async def close(self) -> None:
+        self._records.clear()
+
+    def stats(self) -> dict:
+        self._expire_idle(time.monotonic())
+        return {
+            "size": len(self._records),
+            "max_entries": self.max_entries,
+            "evicted_lru": self.evicted_lru,
+            "evicted_idle": self.evicted_idle,
+        }
@@ -0,0 +1,200 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    StateType,
+    StorageKey,
+)
+from config import (
+    FSM_BATCH_SIZE,
+    FSM_CACHE_SIZE,
+    FSM_CACHE_TTL,
+    FSM_CLEANUP_INTERVAL,
+    FSM_FLUSH_INTERVAL,
+    FSM_STATE_TTL,
+)
+from utils.cache import MISSING, TTLCache
+from utils.db import get_pool
+from utils.logger import logger
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS bot_fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS bot_fsm_updated_at_idx ON bot_fsm (updated_at);
+"""
+
+UPSERT_SQL = """
+INSERT INTO bot_fsm (key, state, data, updated_at)
+VALUES ($1, $2, $3::jsonb, now())
+ON CONFLICT (key) DO UPDATE
+SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = now()
+"""
+
+DELETE_SQL = "DELETE FROM bot_fsm WHERE key = $1"
+
+SELECT_SQL = "SELECT state, data::text FROM bot_fsm WHERE key = $1"
+
+# در حالت write-through فقط نوشتن‌های ناموفق با این فاصله دوباره امتحان می‌شن
+RETRY_FLUSH_INTERVAL = 1.0
+
+CLEANUP_SQL = (
+    "DELETE FROM bot_fsm WHERE updated_at < now() - make_interval(secs => $1)"
+)
+
+
+class PostgresStorage(BaseStorage):
+    def __init__(self):
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # رکوردها (state, data) هستن؛ نوشتن‌ها اول اینجا میان و دسته‌ای flush می‌شن
+        # با چند replica (webhook) کش و تأخیر در نوشتن باعث خوندن state کهنه می‌شن،
+        # برای همین پیش‌فرضشون در این حالت خاموشه
+        self._cache = (
+            TTLCache(FSM_CACHE_SIZE, FSM_CACHE_TTL) if FSM_CACHE_TTL > 0 else None
+        )
+        self._write_through = FSM_FLUSH_INTERVAL <= 0
+        self._pending: Dict[str, Tuple[Optional[str], dict]] = {}
+        self._flush_event = asyncio.Event()
+        self._ready = False
+        self._ready_lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self.flushes = 0
+        self.written = 0
+        self.cleaned = 0
+
+    async def _ensure_ready(self):
+        if self._ready:
+            return
+        async with self._ready_lock:
+            if self._ready:
+                return
+            pool = await get_pool()
+            await pool.execute(CREATE_TABLE_SQL)
+            self._tasks = [
+                asyncio.create_task(self._flush_loop()),
+                asyncio.create_task(self._cleanup_loop()),
+            ]
+            self._ready = True
+
+    async def _load(self, key: str) -> Tuple[Optional[str], dict]:
+        record = self._pending.get(key)
+        if record is not None:
+            return record
+        record = self._cache.get(key) if self._cache is not None else MISSING
+        if record is not MISSING:
+            return record
+        await self._ensure_ready()
+        pool = await get_pool()
+        row = await pool.fetchrow(SELECT_SQL, key)
+        record = (row["state"], json.loads(row["data"])) if row else (None, {})
+        if self._cache is not None:
+            self._cache.set(key, record)
+        return record
+
+    async def _store(self, key: str, record: Tuple[Optional[str], dict]):
+        await self._ensure_ready()
+        if self._cache is not None:
+            self._cache.set(key, record)
+        self._pending[key] = record
+        if self._write_through:
+            await self.flush()
+        elif len(self._pending) >= FSM_BATCH_SIZE:
+            self._flush_event.set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        _, data = await self._load(storage_key)
+        state = state.state if isinstance(state, State) else state
+        await self._store(storage_key, (state, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._load(storage_key)
+        await self._store(storage_key, (state, dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        return dict(data)
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        upserts = []
+        deletes = []
+        for key, (state, data) in batch.items():
+            if state is None and not data:
+                deletes.append((key,))
+            else:
+                upserts.append((key, state, json.dumps(data)))
+        try:
+            pool = await get_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    if upserts:
+                        await conn.executemany(UPSERT_SQL, upserts)
+                    if deletes:
+                        await conn.executemany(DELETE_SQL, deletes)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(batch)} FSM records: {str(e)}")
+            # رکوردهایی که در این فاصله دوباره نوشته نشدن برای flush بعدی برمی‌گردن
+            for key, record in batch.items():
+                self._pending.setdefault(key, record)
+            return
+        self.flushes += 1
+        self.written += len(batch)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._flush_event.wait(),
+                    RETRY_FLUSH_INTERVAL if self._write_through else FSM_FLUSH_INTERVAL,
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(FSM_CLEANUP_INTERVAL)
+            try:
+                pool = await get_pool()
+                result = await pool.execute(CLEANUP_SQL, FSM_STATE_TTL)
+                removed = int(result.split()[-1])
+                self.cleaned += removed
+                logger.info(f"Removed {removed} abandoned FSM records")
+            except Exception as e:
+                logger.error(f"Failed to clean up FSM records: {str(e)}")
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._ready:
+            await self.flush()
+
+    def stats(self) -> dict:
+        stats = {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "written": self.written,
+            "cleaned": self.cleaned,
+            "write_through": self._write_through,
+        }
+        if self._cache is not None:
+            stats.update({f"cache_{k}": v for k, v in self._cache.stats().items()})
+        return stats
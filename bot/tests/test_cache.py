@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+
+from utils.cache import MISSING, TTLCache
+
+
+class TTLCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch("utils.cache.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entry_expires_after_ttl(self):
+        cache = TTLCache(max_size=10, ttl=5)
+        cache.set("a", 1)
+        self.now += 4
+        self.assertEqual(cache.get("a"), 1)
+        self.now += 1
+        self.assertIs(cache.get("a"), MISSING)
+        self.assertNotIn("a", cache)
+        self.assertEqual(len(cache), 0)
+
+    def test_per_entry_ttl(self):
+        cache = TTLCache(max_size=10, ttl=5)
+        cache.set("short", None, ttl=1)
+        cache.set("long", 2)
+        self.now += 2
+        self.assertEqual(cache.get("short", "default"), "default")
+        self.assertEqual(cache.get("long"), 2)
+
+    def test_peek_does_not_touch_order_or_stats(self):
+        cache = TTLCache(max_size=2, ttl=5)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.peek("a"), 1)
+        self.assertIs(cache.peek("missing"), MISSING)
+        cache.set("c", 3)
+        self.assertNotIn("a", cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+        self.now += 5
+        self.assertIs(cache.peek("c"), MISSING)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_stats(self):
+        cache = TTLCache(max_size=10, ttl=60)
+        cache.set("a", 1)
+        self.now += 3
+        cache.get("a")
+        cache.get("b")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+        self.assertEqual(stats["avg_hit_age_s"], 3.0)
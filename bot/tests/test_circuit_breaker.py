@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import patch
+
+from utils.circuit_breaker import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch("utils.circuit_breaker.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10)
+
+    def trip(self):
+        for _ in range(2):
+            self.breaker.check()
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.check()
+        self.assertEqual(self.breaker.stats()["rejected"], 1)
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_half_open_allows_single_probe(self):
+        self.trip()
+        self.now += 10
+        self.breaker.check()
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.check()
+        # اگه probe جواب نداد بعد از reset_timeout یکی دیگه اجازه داره
+        self.now += 10
+        self.breaker.check()
+
+    def test_failed_probe_reopens(self):
+        self.trip()
+        self.now += 10
+        self.breaker.check()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertEqual(self.breaker.trips, 2)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.check()
+
+    def test_successful_probe_closes(self):
+        self.trip()
+        self.now += 10
+        self.breaker.check()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.assertEqual(self.breaker.failures, 0)
+        self.breaker.check()
+        self.breaker.check()
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+
+from utils.locks import KeyedLock
+
+
+class KeyedLockTests(unittest.IsolatedAsyncioTestCase):
+    async def test_waiters_run_in_fifo_order(self):
+        lock = KeyedLock()
+        order = []
+
+        async def worker(n):
+            async with lock("key"):
+                order.append(n)
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*[worker(n) for n in range(5)])
+        self.assertEqual(order, list(range(5)))
+
+    async def test_different_keys_do_not_block(self):
+        lock = KeyedLock()
+        async with lock("a"):
+            await asyncio.wait_for(self._acquire(lock, "b"), timeout=1)
+            self.assertTrue(lock.locked("a"))
+
+    async def test_entry_is_removed_when_unused(self):
+        lock = KeyedLock()
+        async with lock("a"):
+            self.assertEqual(len(lock), 1)
+        self.assertEqual(len(lock), 0)
+        self.assertFalse(lock.locked("a"))
+        with self.assertRaises(RuntimeError):
+            async with lock("a"):
+                raise RuntimeError
+        self.assertEqual(len(lock), 0)
+
+    async def test_entry_kept_while_someone_waits(self):
+        lock = KeyedLock()
+        released = asyncio.Event()
+
+        async def holder():
+            async with lock("a"):
+                await released.wait()
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self._acquire(lock, "a"))
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        self.assertEqual(len(lock), 1)
+        released.set()
+        await asyncio.gather(task, waiter)
+        self.assertEqual(len(lock), 0)
+
+    async def _acquire(self, lock, key):
+        async with lock(key):
+            pass
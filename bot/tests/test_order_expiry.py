@@ -0,0 +1,58 @@
+import asyncio
+import time
+import unittest
+
+from services.order_expiry import OrderExpiryScheduler
+
+
+class OrderExpirySchedulerTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.scheduler = OrderExpiryScheduler()
+
+    def test_pops_due_orders_in_deadline_order(self):
+        self.scheduler.schedule("b", 20)
+        self.scheduler.schedule("a", 10)
+        self.scheduler.schedule("c", 30)
+        self.assertEqual(self.scheduler.pop_due(25), ["a", "b"])
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_reschedule_replaces_deadline(self):
+        self.scheduler.schedule("a", 10)
+        self.scheduler.schedule("a", 50)
+        self.assertEqual(self.scheduler.pop_due(20), [])
+        self.assertEqual(self.scheduler.pop_due(50), ["a"])
+        self.assertEqual(self.scheduler.pop_due(100), [])
+
+    def test_cancel(self):
+        self.scheduler.schedule("a", 10)
+        self.scheduler.schedule("b", 20)
+        self.scheduler.cancel("a")
+        self.scheduler.cancel("missing")
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual(self.scheduler.pop_due(100), ["b"])
+
+    def test_heap_is_compacted_after_many_cancels(self):
+        for n in range(200):
+            self.scheduler.schedule(str(n), n)
+        for n in range(199):
+            self.scheduler.cancel(str(n))
+        self.assertLess(len(self.scheduler._heap), 200)
+        self.assertEqual(self.scheduler.pop_due(1000), ["199"])
+
+    def test_schedule_order_skips_orders_with_receipt(self):
+        self.scheduler.schedule_order(
+            {"order_id": "a", "created_at": "2026-01-01T00:00:00Z", "receipt_url": "x"}
+        )
+        self.scheduler.schedule_order(
+            {"order_id": "b", "created_at": "2026-01-01T00:00:00Z"}
+        )
+        self.assertEqual(self.scheduler.pop_due(time.time()), ["b"])
+
+    async def test_wait_next_wakes_on_earlier_deadline(self):
+        self.scheduler.schedule("late", time.time() + 3600)
+        waiter = asyncio.create_task(self.scheduler.wait_next())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        self.scheduler.schedule("soon", time.time() - 1)
+        await asyncio.wait_for(waiter, timeout=1)
+        self.assertEqual(self.scheduler.pop_due(time.time()), ["soon"])
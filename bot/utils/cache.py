@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.hit_age_total = 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        self.hit_age_total += time.monotonic() - entry[2]
+        return entry[0]
+
+    def peek(self, key: Hashable, default: Any = MISSING) -> Any:
+        # بدون تغییر ترتیب LRU و آمار hit/miss
+        entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def age(self, key: Hashable) -> Optional[float]:
+        entry = self._data.get(key)
+        return time.monotonic() - entry[2] if entry is not None else None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        now = time.monotonic()
+        self._data[key] = (value, now + (self.ttl if ttl is None else ttl), now)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        now = time.monotonic()
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "avg_hit_age_s": round(self.hit_age_total / self.hits, 1)
+            if self.hits
+            else 0.0,
+            "max_age_s": round(
+                max((now - entry[2] for entry in self._data.values()), default=0.0), 1
+            ),
+        }
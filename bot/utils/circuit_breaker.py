@@ -0,0 +1,60 @@
+import time
+
+import aiohttp
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(aiohttp.ClientConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+
+    def check(self):
+        now = time.monotonic()
+        if self.state == STATE_OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = STATE_HALF_OPEN
+            self.probe_started_at = 0.0
+        if self.state == STATE_HALF_OPEN:
+            # فقط یک درخواست آزمایشی؛ اگه گیر کرد بعد از reset_timeout یکی دیگه
+            if now - self.probe_started_at >= self.reset_timeout:
+                self.probe_started_at = now
+                return
+        elif self.state == STATE_CLOSED:
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"Circuit breaker for {self.name} is {self.state}")
+
+    def record_success(self):
+        self.state = STATE_CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN or (
+            self.state == STATE_CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.state = STATE_OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
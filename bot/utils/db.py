@@ -0,0 +1,54 @@
+import asyncio
+from typing import Optional
+
+import asyncpg
+from config import (
+    DB_HOST,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_PORT,
+    DB_USER,
+)
+from utils.logger import logger
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool() -> asyncpg.Pool:
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    host=DB_HOST,
+                    port=DB_PORT,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    database=DB_NAME,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                )
+                logger.info(f"Database pool opened for {DB_HOST}:{DB_PORT}/{DB_NAME}")
+    return _pool
+
+
+async def connect() -> asyncpg.Connection:
+    # اتصال جدا از pool، برای LISTEN که باید همیشه باز بمونه
+    return await asyncpg.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+    )
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logger.debug("Database pool closed")
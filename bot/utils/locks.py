@@ -0,0 +1,28 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable, List
+
+
+class KeyedLock:
+    def __init__(self):
+        # هر کلید یک قفل و تعداد منتظرها؛ وقتی کسی منتظر نباشه پاک می‌شه
+        self._locks: Dict[Hashable, List] = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    def locked(self, key: Hashable) -> bool:
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    @asynccontextmanager
+    async def __call__(self, key: Hashable):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
@@ -1,34 +1,167 @@
-from datetime import datetime, timedelta
+import asyncio
+import base64
+import json
+import time
+from typing import AsyncIterator, Optional, Set
 
-import requests
-from config import ADMIN_PASSWORD, ADMIN_USERNAME, API_BASE_URL
+import aiohttp
+from config import (
+    ADMIN_PASSWORD,
+    ADMIN_USERNAME,
+    API_BASE_URL,
+    MARZBAN_TOKEN_REFRESH_MARGIN,
+)
+from services.api_client import APIClient
 from utils.logger import logger
 
-_jwt_token = None
-_token_expiry = None
+# اگه توکن فیلد exp نداشت، مثل قبل 1 ساعت اعتبار در نظر می‌گیریم
+DEFAULT_TOKEN_LIFETIME = 3600
+# چند ثانیه قبل از انقضای واقعی، توکن رو دیگه معتبر حساب نمی‌کنیم
+TOKEN_EXPIRY_SKEW = 10
+# تعداد کاربرهایی که هر صفحه‌ی iter_marzban_users با صفحه‌ی قبل هم‌پوشانی داره
+MARZBAN_PAGE_OVERLAP = 20
 
 
-def get_jwt_token():
-    global _jwt_token, _token_expiry
-    if _jwt_token and _token_expiry and datetime.now() < _token_expiry:
-        return _jwt_token
-
-    url = f"{API_BASE_URL}/api/admin/token"
-    data = {
-        "username": ADMIN_USERNAME,
-        "password": ADMIN_PASSWORD,
-        "grant_type": "password",
-    }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+def decode_token_expiry(token: str) -> Optional[float]:
     try:
-        response = requests.post(url, data=data, headers=headers, timeout=5)
-        response.raise_for_status()
-        token_data = response.json()
-        _jwt_token = token_data["access_token"]
-        # فرض می‌کنیم توکن 1 ساعت اعتبار داره
-        _token_expiry = datetime.now() + timedelta(hours=1)
-        logger.info("JWT token retrieved successfully")
-        return _jwt_token
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to get JWT token: {str(e)}")
-        raise Exception(f"Failed to get JWT token: {str(e)}") from e
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Could not decode JWT expiry: {e}")
+        return None
+
+
+class MarzbanTokenManager:
+    def __init__(self, refresh_margin: float = MARZBAN_TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _is_valid(self) -> bool:
+        return (
+            self._token is not None
+            and time.time() < self._expires_at - TOKEN_EXPIRY_SKEW
+        )
+
+    async def get_token(self) -> str:
+        if self._is_valid():
+            return self._token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        # همه‌ی درخواست‌های هم‌زمان منتظر همین یک درخواست می‌مونن
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch_token())
+        return await asyncio.shield(self._inflight)
+
+    def invalidate(self, token: str):
+        if token == self._token:
+            self._token = None
+            self._expires_at = 0.0
+
+    async def _fetch_token(self) -> str:
+        data = {
+            "username": ADMIN_USERNAME,
+            "password": ADMIN_PASSWORD,
+            "grant_type": "password",
+        }
+        try:
+            token_data = await APIClient.request(
+                "POST", "/api/admin/token", data=data, base_url=API_BASE_URL
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Failed to get JWT token: {str(e)}")
+            raise Exception(f"Failed to get JWT token: {str(e)}") from e
+        token = token_data["access_token"]
+        expires_at = decode_token_expiry(token)
+        self._token = token
+        self._expires_at = expires_at or time.time() + DEFAULT_TOKEN_LIFETIME
+        logger.info(
+            f"JWT token retrieved successfully, valid for {int(self._expires_at - time.time())}s"
+        )
+        return token
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                if self._token is None:
+                    await self.refresh()
+                delay = self._expires_at - self.refresh_margin - time.time()
+                await asyncio.sleep(max(delay, 30))
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Background JWT refresh failed: {e}")
+                await asyncio.sleep(30)
+
+    def start(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+token_manager = MarzbanTokenManager()
+
+
+async def get_jwt_token() -> str:
+    return await token_manager.get_token()
+
+
+async def marzban_request(
+    method: str, url: str, payload: dict = None, params: dict = None
+):
+    token = await token_manager.get_token()
+    for attempt in range(2):
+        try:
+            return await APIClient.request(
+                method,
+                url,
+                params=params,
+                json=payload,
+                headers={"Authorization": f"Bearer {token}"},
+                base_url=API_BASE_URL,
+            )
+        except aiohttp.ClientResponseError as e:
+            if e.status != 401 or attempt > 0:
+                raise
+            logger.warning(f"Marzban returned 401 for {url}, refreshing JWT token")
+            token_manager.invalidate(token)
+            token = await token_manager.get_token()
+
+
+async def iter_marzban_users(page_size: int) -> AsyncIterator[dict]:
+    # با sort=created_at کاربرهای جدید ته لیست اضافه می‌شن و صفحه‌ها جابه‌جا نمی‌شن؛
+    # هر صفحه چند کاربر عقب‌تر شروع می‌شه تا حذف کاربر وسط sweep باعث جا افتادن
+    # نشه، و تکراری‌ها با صفحه‌ی قبل حذف می‌شن
+    overlap = min(MARZBAN_PAGE_OVERLAP, page_size // 2)
+    offset = 0
+    previous: Set[str] = set()
+    while True:
+        page = await marzban_request(
+            "GET",
+            "/api/users",
+            params={"offset": offset, "limit": page_size, "sort": "created_at"},
+        )
+        users = page.get("users", [])
+        current = set()
+        for user in users:
+            current.add(user.get("username"))
+            if user.get("username") in previous:
+                continue
+            yield user
+        if len(users) < page_size or offset + len(users) >= page.get("total", 0):
+            break
+        offset += len(users) - overlap
+        previous = current